@@ -1,7 +1,7 @@
 import streamlit as st
 
 from modules.constants import st_icons, mat_icons
-from modules.utilities import download_json_file, upload_json_file
+from modules.utilities import habitat_download_button, upload_json_file
 
 
 pages = {
@@ -10,6 +10,7 @@ pages = {
     ],
     "Planners": [
         st.Page(page="sections/habitat_planner.py", title="Habitat Planner", icon=st_icons["hab"]),
+        st.Page(page="sections/portfolio.py", title="Habitat Portfolio", icon=st_icons["portfolio"]),
         st.Page(page="sections/ship_designer.py", title="Ship Designer", icon=st_icons["ship"])
     ],
     "Resources": [
@@ -17,16 +18,17 @@ pages = {
     ]
 }
 
-st.navigation(pages).run()
+page = st.navigation(pages)
+page.run()
 
 
 with st.sidebar:
     st.write("")
 
-    if "habitat" in st.session_state:
-        st.download_button(label="**Save Habitat as JSON**", use_container_width=True,
-                           file_name="habitat_data.json", mime="application/json",
-                           data=download_json_file(st.session_state))
+    # The habitat planner edits the habitat in fragment reruns, which don't redraw the sidebar,
+    # so it draws its own download button
+    if "habitat" in st.session_state and page.url_path != "habitat_planner":
+        habitat_download_button()
 
     with st.expander(label="Load Habitat JSON file", icon=mat_icons["upload"], expanded=False):
 
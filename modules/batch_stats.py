@@ -0,0 +1,157 @@
+import os
+import csv
+import sys
+import json
+import argparse
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+
+from modules.habitat_slots import load_habitat
+from modules.habitat_stats import construction_bonus
+from modules.stats_engine import CAN_FOUND, get_engine, habitat_cells
+from modules.utilities import load_module_data
+
+HABITAT_FIELDS = ["source", "name", "type", "core", "tier", "body"]
+
+
+@lru_cache(maxsize=None)
+def _worker_engine(template: str):
+    all_modules = load_module_data(template)
+    return all_modules, get_engine(all_modules)
+
+
+def stat_fields(template: str) -> list[str]:
+    """
+    Output columns: the habitat identity followed by every habitat stat.
+    """
+    _, engine = _worker_engine(template)
+    return HABITAT_FIELDS + [k for k in engine.columns if not k.startswith("_")] \
+        + ["CanFoundHabs", "constructionBonus", "error"]
+
+
+def iter_habitats(path: Path):
+    """
+    Yield (source, habitat) pairs from a directory of habitat JSON files, or a JSON Lines file.
+    """
+    if path.is_dir():
+        for file_path in sorted(path.glob("*.json")):
+            yield file_path.name, file_path.read_text(encoding="utf-8")
+    else:
+        with open(path, "r", encoding="utf-8") as file:
+            for line_no, line in enumerate(file, start=1):
+                if line.strip():
+                    yield f"{path.name}:{line_no}", line
+
+
+def evaluate_habitats(chunk: list[tuple[str, str]], template: str) -> list[dict]:
+    """
+    Compute the stats rows of a chunk of (source, habitat JSON) pairs.
+    Habitats are parsed like the planner loads them, so unknown modules are left out.
+    """
+    all_modules, engine = _worker_engine(template)
+    rows = []
+    for source, raw in chunk:
+        row = {"source": source}
+        try:
+            habitat = load_habitat(json.loads(raw), all_modules)
+            row.update({k: habitat.get(k) for k in HABITAT_FIELDS[1:]})
+            cells = habitat_cells(habitat, engine.names)
+            modules = [m[-1] for m in cells.values() if m[-1]]
+            counts = engine.count_vector(modules)
+            mining_module = cells.get("0_3", [None])[-1]
+            totals = engine.evaluate(counts, habitat.get("body", "Earth (LEO)"), habitat.get("site", {}),
+                                     engine.mining_modifier_of(mining_module))
+
+            row.update({k: float(totals[i]) for i, k in enumerate(engine.columns) if not k.startswith("_")})
+            row["CanFoundHabs"] = bool(totals[engine.column_index[CAN_FOUND]] > 0)
+            row["constructionBonus"] = construction_bonus(modules.count("NanofacturingComplex"),
+                                                          modules.count("Nanofactory"),
+                                                          modules.count("ConstructionModule"))
+        except (ValueError, KeyError, IndexError, TypeError, AttributeError) as e:
+            row["error"] = f"{type(e).__name__}: {e}"
+        rows.append(row)
+    return rows
+
+
+def chunked(items, size: int):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def evaluate_chunks(pool: ProcessPoolExecutor, chunks, template: str, window: int):
+    """
+    Yield the stats rows of each chunk, in order, keeping at most window chunks submitted at a time,
+    so the input is read as the output is written.
+    """
+    pending = deque()
+    for chunk in chunks:
+        pending.append(pool.submit(evaluate_habitats, chunk, template))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def parquet_writer(output: Path, fields: list[str]):
+    """
+    Open a Parquet writer of the output columns, typed from the field names.
+    """
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ImportError("Parquet output requires pyarrow (pip install pyarrow), write a .csv file instead") from None
+
+    types = {**{f: pa.string() for f in HABITAT_FIELDS + ["error"]}, "tier": pa.int64(), "CanFoundHabs": pa.bool_()}
+    schema = pa.schema([(f, types.get(f, pa.float64())) for f in fields])
+    return pq.ParquetWriter(output, schema), lambda rows: pa.Table.from_pylist(rows, schema=schema)
+
+
+def run_batch(source: Path, output: Path, template: str = "data/TIHabModuleTemplate.json",
+              workers: int | None = None, chunk_size: int = 64) -> int:
+    """
+    Score every habitat of a directory or JSON Lines file, and write the stats to CSV or Parquet.
+    Habitats are streamed through the workers in chunks. Returns the number of habitats evaluated.
+    """
+    fields = stat_fields(template)
+    chunks = chunked(iter_habitats(source), chunk_size)
+    workers = workers or os.cpu_count() or 1
+
+    count = 0
+    if output.suffix == ".parquet":
+        writer, to_table = parquet_writer(output, fields)
+        with writer, ProcessPoolExecutor(max_workers=workers) as pool:
+            for rows in evaluate_chunks(pool, chunks, template, 2 * workers):
+                writer.write_table(to_table(rows))
+                count += len(rows)
+        return count
+
+    with open(output, "w", newline="", encoding="utf-8") as file, ProcessPoolExecutor(max_workers=workers) as pool:
+        writer = csv.DictWriter(file, fieldnames=fields)
+        writer.writeheader()
+        for rows in evaluate_chunks(pool, chunks, template, 2 * workers):
+            writer.writerows(rows)
+            count += len(rows)
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute the stats of saved habitat JSON files.")
+    parser.add_argument("source", type=Path, help="directory of habitat .json files, or a .jsonl file")
+    parser.add_argument("output", type=Path, help="output .csv or .parquet file")
+    parser.add_argument("--template", default="data/TIHabModuleTemplate.json", help="module template JSON")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--chunk-size", type=int, default=64)
+    args = parser.parse_args()
+
+    total = run_batch(args.source, args.output, args.template, args.workers, args.chunk_size)
+    print(f"{total} habitats written to {args.output}", file=sys.stderr)
@@ -0,0 +1,198 @@
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import subprocess
+import statistics
+import streamlit as st
+
+from datetime import datetime, timezone
+from pathlib import Path
+from streamlit import logger as st_logger
+
+from modules import constants as c
+from modules import clickable_image as ci
+from modules import habitat_module as hm
+from modules.build_simulator import simulate_habitat
+from modules.habitat_grid import grid_render
+from modules.habitat_slots import CORE_CELL, MINING_CELL, MODULE_CELL, habitat_table, load_habitat, slot_table
+from modules.habitat_stats import display_habitat_stats
+from modules.module_catalog import ModuleCatalog
+from modules.stats_engine import StatsAccumulator, compute_habitat_stats, get_engine
+from modules.utilities import load_module_data
+
+HISTORY_PATH = Path("data/benchmark_history.json")
+STAGES = ("module_image", "clickable_image", "module_tooltip", "habitat_grid", "filter_modules",
+          "display_habitat_stats", "display_habitat_stats_incremental", "build_simulation")
+
+
+class StubState(dict):
+    """
+    Stand-in for st.session_state: a dictionary with attribute access.
+    """
+    __getattr__ = dict.get
+    __setattr__ = dict.__setitem__
+
+
+def synthetic_habitats(all_modules: ModuleCatalog, seed: int = 0) -> dict[str, dict]:
+    """
+    One fully populated habitat per habitat type and tier of habitat_layouts, with random modules.
+    """
+    rng = random.Random(seed)
+    habitats = {}
+    for hab_type, layouts in c.habitat_layouts.items():
+        for tier in layouts:
+            core = all_modules.select(hab_types=(hab_type,), tiers=(tier,), core=True)[0]
+            modules = all_modules.select(hab_types=(hab_type, "Any"), tiers=range(1, tier + 1), core=False)
+            mining = all_modules.select(hab_types=(hab_type, "Any"), tiers=range(1, tier + 1), core=False,
+                                        mining=True)
+            table = slot_table(hab_type, tier)
+            choices = {MINING_CELL: mining, MODULE_CELL: modules}
+            cells = {label: [cell, core if cell == CORE_CELL else rng.choice(choices[cell])]
+                     for label, cell in zip(table.labels, table.cell_types.tolist())}
+            habitats[f"{hab_type} T{tier}"] = {
+                "cells": cells, "core": core, "tier": tier, "type": hab_type.lower(), "body": "Mars",
+                "name": f"Benchmark {hab_type} T{tier}", "site": {"water": 2, "metals": 1}}
+    return habitats
+
+
+def clear_caches(all_modules: ModuleCatalog) -> None:
+    """
+    Empty the process-wide caches, so the next rerun is timed cold.
+    """
+    hm._tiles.clear()
+    ci.clear_uri_cache()
+    all_modules.tooltips.clear()
+    compute_habitat_stats.cache_clear()
+
+
+def rerun_stages(habitat: dict, all_modules: ModuleCatalog, accumulator: StatsAccumulator) -> dict[str, float]:
+    """
+    Time each stage of a full planner rerun of a habitat, in seconds.
+    Stages mirror the calls of sections/habitat_planner.py for every cell, then for the stats column.
+    """
+    core = all_modules[habitat["core"]]
+    state = StubState(habitat=load_habitat(habitat, all_modules), clicked_cell=0)
+    slots = range(len(state.habitat["slots"]))
+    timings = {}
+
+    start = time.perf_counter()
+    tiles = [hm.module_image(core, slot, state, all_modules) for slot in slots]
+    timings["module_image"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    payload = sum(len(ci.cached_data_uri(tile)) for tile in tiles)
+    timings["clickable_image"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for slot in slots:
+        hm.module_tooltip(slot, state, all_modules)
+    timings["module_tooltip"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    grid_render(core, state, all_modules)
+    timings["habitat_grid"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    mining_cell = habitat_table(state.habitat).cell_types[state.clicked_cell] == MINING_CELL
+    hm.filter_modules(core, [], all_modules, mining_cell)
+    timings["filter_modules"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    display_habitat_stats(habitat, all_modules)
+    timings["display_habitat_stats"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    display_habitat_stats(state.habitat, all_modules, accumulator)
+    timings["display_habitat_stats_incremental"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    simulate_habitat(state.habitat, all_modules, count=256)
+    timings["build_simulation"] = time.perf_counter() - start
+
+    timings["payload_bytes"] = payload
+    return timings
+
+
+def run_benchmarks(repeat: int = 20, seed: int = 0) -> dict[str, dict]:
+    """
+    Time a cold rerun, then repeat warm reruns, of every synthetic habitat.
+    Returns per habitat and stage the cold time and warm min/median times in milliseconds.
+    """
+    all_modules = load_module_data()
+    results = {}
+    for name, habitat in synthetic_habitats(all_modules, seed).items():
+        clear_caches(all_modules)
+        accumulator = StatsAccumulator(get_engine(all_modules))
+        cold = rerun_stages(habitat, all_modules, accumulator)
+        warm = [rerun_stages(habitat, all_modules, accumulator) for _ in range(repeat)]
+
+        results[name] = {stage: {"cold_ms": cold[stage] * 1e3,
+                                 "min_ms": min(w[stage] for w in warm) * 1e3,
+                                 "median_ms": statistics.median(w[stage] for w in warm) * 1e3}
+                         for stage in STAGES}
+        results[name]["payload_bytes"] = cold["payload_bytes"]
+    return results
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def record_results(results: dict, path: Path = HISTORY_PATH) -> list[dict]:
+    """
+    Append a benchmark run to the JSON history file, and return the whole history.
+    """
+    history = json.loads(path.read_text()) if path.exists() else []
+    history.append({
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    })
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(history, indent=1))
+    return history
+
+
+def report(results: dict, previous: dict | None = None) -> str:
+    """
+    Format the warm median times as a table, with the ratio to the previous run when there is one.
+    """
+    lines = [f"{'habitat':<12}{'stage':<36}{'cold ms':>10}{'median ms':>12}{'vs prev':>9}"]
+    for name, stages in results.items():
+        for stage in STAGES:
+            timing = stages[stage]
+            ratio = ""
+            if previous and stage in previous.get(name, {}) and previous[name][stage]["median_ms"]:
+                ratio = f"{timing['median_ms'] / previous[name][stage]['median_ms']:.2f}x"
+            lines.append(f"{name:<12}{stage:<36}{timing['cold_ms']:>10.3f}{timing['median_ms']:>12.3f}{ratio:>9}")
+        lines.append(f"{name:<12}{'payload_bytes':<36}{stages['payload_bytes']:>22}")
+    return "\n".join(lines)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the habitat planner rerun stages on synthetic habitats.")
+    parser.add_argument("--repeat", type=int, default=20, help="warm reruns per habitat")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--history", type=Path, default=HISTORY_PATH, help="JSON history file")
+    parser.add_argument("--no-record", action="store_true", help="don't append the run to the history")
+    args = parser.parse_args()
+
+    # Streamlit calls run in bare mode, without a server or session; silence its warnings about it.
+    # Reading an option first loads the config, which would reset the log level later on
+    st.get_option("logger.level")
+    st_logger.set_log_level("error")
+
+    benchmark = run_benchmarks(args.repeat, args.seed)
+    runs = json.loads(args.history.read_text()) if args.history.exists() else []
+    print(report(benchmark, runs[-1]["results"] if runs else None), file=sys.stderr)
+    if not args.no_record:
+        record_results(benchmark, args.history)
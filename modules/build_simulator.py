@@ -0,0 +1,216 @@
+import numpy as np
+import streamlit as st
+
+from dataclasses import dataclass
+
+from modules import constants as c
+from modules.habitat_slots import EMPTY, habitat_table, slot_table
+from modules.habitat_stats import construction_bonuses, format_number
+from modules.module_catalog import ModuleCatalog
+from modules.portfolio import BODY_MODIFIERS, LEO_BODY, Portfolio
+from modules.profiling import span
+from modules.stats_engine import RESOURCES, get_engine
+
+MONTH_DAYS = 30
+CONSTRUCTION_MODULES = ("NanofacturingComplex", "Nanofactory", "ConstructionModule")  # T3, T2, T1
+
+
+@dataclass(frozen=True, slots=True)
+class BuildSimulation:
+    """
+    Month by month projection of build orders, one row per order.
+    Modules are built one at a time, in order; each takes its buildTime_Days times the best
+    constructionTimeModifier of the modules completed before it starts. Build materials are spent
+    when a module starts, and a module produces its stats from the month it completes.
+    A habitat only goes through one state per step of its order, so the stats are evaluated per step
+    and looked up by the number of steps completed each month.
+    """
+    columns: dict[str, int]  # Stat column indices of step_stats
+    orders: np.ndarray  # (orders, steps) module ids, EMPTY padded
+    start_days: np.ndarray  # (orders, steps), inf for padding
+    finish_days: np.ndarray  # (orders, steps), inf for padding
+    days: np.ndarray  # (months,) day at the end of each month
+    completed: np.ndarray  # (orders, months) steps completed by the end of each month
+    started: np.ndarray  # (orders, months) steps started by the end of each month
+    step_stats: np.ndarray  # (orders, steps + 1, columns) habitat stats after each number of completed steps
+    step_spent: np.ndarray  # (orders, steps + 1, resources) build materials of the first steps, RESOURCES order
+    step_bonus: np.ndarray  # (orders, steps + 1) construction bonus after each number of completed steps
+
+    def monthly(self, key: str) -> np.ndarray:
+        """
+        A monthly stat of every order, e.g. "incomeResearch_month"; "money" includes the money support term.
+        """
+        if key == "money":
+            return self.monthly("incomeMoney_month") + self.monthly("supportMaterials_month.money")
+        return np.take_along_axis(self.step_stats[..., self.columns[key]], self.completed, axis=1)
+
+    def cumulative(self, key: str) -> np.ndarray:
+        return np.cumsum(self.monthly(key), axis=-1)
+
+    def spent(self, resource: str) -> np.ndarray:
+        """
+        Build materials spent by the end of each month.
+        """
+        return np.take_along_axis(self.step_spent[..., RESOURCES.index(resource)], self.started, axis=1)
+
+    def balance(self, resource: str) -> np.ndarray:
+        """
+        Running stock of a resource: cumulative monthly production and upkeep, minus the materials spent.
+        """
+        return self.cumulative(f"supportMaterials_month.{resource}") - self.spent(resource)
+
+    def construction_bonus(self) -> np.ndarray:
+        return np.take_along_axis(self.step_bonus, self.completed, axis=1)
+
+    def completion_days(self) -> np.ndarray:
+        """
+        Day the last module of each order completes.
+        """
+        return np.where(self.orders != EMPTY, self.finish_days, 0).max(axis=-1, initial=0)
+
+
+@span()
+def simulate(all_modules: ModuleCatalog, orders: np.ndarray, prebuilt: np.ndarray, months: int = 120,
+             solar_modifier: float | np.ndarray = 1.0, in_leo: bool | np.ndarray = True,
+             site: dict | np.ndarray | None = None, mining_cells: np.ndarray | None = None) -> BuildSimulation:
+    """
+    Project build orders over a number of months.
+    orders holds the module ids to build, one row per order, EMPTY entries being skipped; prebuilt holds the module
+    counts already built before the first step, one row per order or shared. The solar power modifier,
+    LEO flag and site resources (engine site_vector rows) are per order arrays or shared. mining_cells flags
+    the step of each order building the module of the mining cell, whose mining modifier applies from then on.
+    """
+    engine = get_engine(all_modules)
+    orders = np.atleast_2d(np.asarray(orders, dtype=np.int16))
+    mining_cells = np.zeros(orders.shape, dtype=bool) if mining_cells is None \
+        else np.broadcast_to(mining_cells, orders.shape)
+    order = np.argsort(orders == EMPTY, axis=1, kind="stable")
+    orders, mining_cells = np.take_along_axis(orders, order, axis=1), np.take_along_axis(mining_cells, order, axis=1)
+    n_orders, n_steps = orders.shape
+    prebuilt = np.broadcast_to(np.asarray(prebuilt, dtype=float), (n_orders, len(engine.names)))
+    valid = orders != EMPTY
+    ids = np.where(valid, orders, 0)
+
+    # Build schedule, one step at a time across all orders
+    build_days = np.where(valid, all_modules.stat_column("buildTime_Days")[ids], 0)
+    time_modifiers = np.where(valid, all_modules.stat_column("constructionTimeModifier")[ids], 1)
+    modifier = np.where(prebuilt > 0, all_modules.stat_column("constructionTimeModifier"), 1).min(axis=1)
+    start_days, finish_days = np.empty((n_orders, n_steps)), np.empty((n_orders, n_steps))
+    day = np.zeros(n_orders)
+    for step in range(n_steps):
+        start_days[:, step] = day
+        day = day + build_days[:, step] * modifier
+        finish_days[:, step] = day
+        modifier = np.minimum(modifier, time_modifiers[:, step])
+    start_days[~valid], finish_days[~valid] = np.inf, np.inf
+
+    # Orders are sequential, so the started and completed modules of a month are prefixes of the order
+    days = np.arange(1, months + 1) * MONTH_DAYS
+    completed = (finish_days[:, None, :] <= days[None, :, None]).sum(axis=-1)
+    started = (start_days[:, None, :] <= days[None, :, None]).sum(axis=-1)
+
+    def prefix_sums(values):
+        """
+        Sums of the first n steps of every order, for n = 0 to n_steps.
+        """
+        values = np.where(valid[..., None], values, 0)
+        return np.concatenate([np.zeros((n_orders, 1, values.shape[-1])), np.cumsum(values, axis=1)], axis=1)
+
+    one_hot = np.eye(len(engine.names))
+    linear = (prebuilt @ engine.matrix)[:, None, :] + prefix_sums(engine.matrix[ids])
+    admin_counts = engine.admin_counts(prebuilt)[:, None, :] + prefix_sums(engine.admin_counts(one_hot)[ids])
+
+    # Only the module of the mining cell sets the mining modifier, as in the stats engine
+    mining_steps = np.where(mining_cells, engine.mining_modifier[ids], 0)
+    mining_modifier = prefix_sums(mining_steps[..., None])[..., 0]
+
+    site = site if isinstance(site, np.ndarray) else engine.site_vector(site)
+    step_stats = engine.apply_rules_at(linear, admin_counts, np.asarray(solar_modifier, dtype=float)[..., None],
+                                       np.asarray(in_leo)[..., None], site[:, None, :] if site.ndim > 1 else site,
+                                       mining_modifier)
+
+    build_columns = [engine.column_index[f"weightedBuildMaterials.{r}"] for r in RESOURCES]
+    step_spent = prefix_sums(engine.matrix[ids][..., build_columns])
+
+    construction_ids = [all_modules.position[name] for name in CONSTRUCTION_MODULES]
+    construction_counts = prebuilt[:, None, construction_ids] + prefix_sums(one_hot[:, construction_ids][ids])
+    step_bonus = construction_bonuses(*np.moveaxis(construction_counts.astype(int), -1, 0))
+
+    return BuildSimulation(columns=engine.column_index, orders=orders, start_days=start_days,
+                           finish_days=finish_days, days=days, completed=completed, started=started,
+                           step_stats=step_stats, step_spent=step_spent, step_bonus=step_bonus)
+
+
+def habitat_orders(habitat: dict, all_modules: ModuleCatalog, count: int = 1,
+                   seed: int = 0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Build orders of the modules of a planner habitat, the prebuilt counts: its core, and the mining cell flags
+    of the orders. The first order follows the slot order, the others are random permutations of it.
+    """
+    table, slots = habitat_table(habitat), np.asarray(habitat["slots"])
+    cells = np.flatnonzero(slots != EMPTY)
+    cells = cells[cells != table.core_slot]
+    rng = np.random.default_rng(seed)
+    cells = np.array([cells] + [rng.permutation(cells) for _ in range(count - 1)], dtype=int).reshape(count, -1)
+
+    prebuilt = np.zeros(len(all_modules.names))
+    if slots[table.core_slot] != EMPTY:
+        prebuilt[slots[table.core_slot]] = 1
+    return slots[cells].astype(np.int16), prebuilt, cells == table.mining_slot
+
+
+def simulate_habitat(habitat: dict, all_modules: ModuleCatalog, count: int = 1, months: int = 120,
+                     seed: int = 0) -> BuildSimulation:
+    """
+    Simulate count build orders of a planner habitat, see habitat_orders, from its founding.
+    """
+    orders, prebuilt, mining_cells = habitat_orders(habitat, all_modules, count, seed)
+    body = habitat.get("body", "Earth (LEO)")
+    return simulate(all_modules, orders, prebuilt, months, c.solar_modifiers[body], body == "Earth (LEO)",
+                    habitat.get("site", {}), mining_cells)
+
+
+def simulate_portfolio(portfolio: Portfolio, months: int = 120) -> BuildSimulation:
+    """
+    Simulate every habitat of a portfolio, from its founding, building its modules in slot order.
+    One order per habitat, all simulated in one batch.
+    """
+    n_habitats = len(portfolio)
+    core_slots = np.array([slot_table(t, tier).core_slot for t, tier
+                           in zip(portfolio.hab_types.tolist(), portfolio.tiers.tolist())], dtype=int)
+    rows = np.arange(n_habitats)
+    orders = portfolio.slots.copy()
+    orders[rows, core_slots] = EMPTY
+
+    prebuilt = np.zeros((n_habitats, len(portfolio.all_modules.names)))
+    cores = portfolio.slots[rows, core_slots]
+    prebuilt[rows[cores != EMPTY], cores[cores != EMPTY]] = 1
+    mining_cells = np.arange(orders.shape[1]) == portfolio.mining_slots[:, None]
+    return simulate(portfolio.all_modules, orders, prebuilt, months, BODY_MODIFIERS[portfolio.bodies],
+                    portfolio.bodies == LEO_BODY, portfolio.site_vectors(), mining_cells)
+
+
+def display_build_simulation(habitat: dict, all_modules: ModuleCatalog, count: int = 256,
+                             months: int = 120) -> None:
+    """
+    Display the build schedule of a habitat in slot order against the fastest of count random orders,
+    and the running money, water and volatiles balances of the slot order.
+    """
+    simulation = simulate_habitat(habitat, all_modules, count, months)
+    if not simulation.orders.size:
+        return
+    completion = simulation.completion_days() / MONTH_DAYS
+    fastest = int(np.argmin(completion))
+    st.caption(f"All modules built in {format_number(completion[0])} months in slot order, "
+               f"{format_number(completion[fastest])} months in the fastest of {count} orders")
+
+    def schedule(row):
+        return [f"{all_modules.friendly_names[all_modules.names[i]]} "
+                f"({format_number(day / MONTH_DAYS)})"
+                for i, day in zip(simulation.orders[row].tolist(), simulation.finish_days[row].tolist())]
+
+    st.dataframe({"Slot order (month built)": schedule(0), "Fastest order (month built)": schedule(fastest)},
+                 hide_index=True, use_container_width=True)
+    st.line_chart({"Month": simulation.days // MONTH_DAYS, "Money": simulation.cumulative("money")[0],
+                   "Water": simulation.balance("water")[0], "Volatiles": simulation.balance("volatiles")[0]},
+                  x="Month", y_label="Balance")
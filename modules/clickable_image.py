@@ -1,12 +1,20 @@
+import os
 import base64
+import hashlib
+import tempfile
+import threading
 import numpy as np
+import streamlit as st
 import streamlit.components.v1 as components
 
+from collections import OrderedDict
 from io import BytesIO
 from pathlib import Path
 from PIL import Image
 from streamlit.elements.image import UseColumnWith
 
+from modules.profiling import cache_lookup, payload, span
+
 ####
 # Code borrowed and adapted from blackary.
 # https://github.com/blackary/streamlit-image-coordinates
@@ -19,8 +27,158 @@ _component_func = components.declare_component(
     "streamlit_clickable_image", path=str(frontend_dir)
 )
 
+# Encoded data URIs, least recently used first, bounded by their total size
+URI_CACHE_MAX_BYTES = 64 * 1024 * 1024
+_uri_cache: OrderedDict[tuple, str] = OrderedDict()
+_uri_cache_bytes = 0
+_uri_cache_lock = threading.Lock()  # Sessions run as threads of one process
+
+
+def image_fingerprint(image: np.ndarray | object) -> tuple:
+    """
+    Cheap content key of a PIL image or numpy array, hashing its raw pixels instead of encoding them.
+    """
+    if isinstance(image, np.ndarray):
+        return "array", image.dtype.str, image.shape, hashlib.blake2b(image.tobytes(), digest_size=16).digest()
+    return image.mode, image.size, hashlib.blake2b(image.tobytes(), digest_size=16).digest()  # type: ignore
+
+
+@span()
+def encode_image(image: np.ndarray | object, image_format: str = "PNG", compress_level: int | None = None) -> str:
+    """
+    Encode a PIL image or numpy array into a base64 data URI.
+    compress_level trades PNG size for encoding speed (0-9, Pillow default 6);
+    WEBP is encoded losslessly.
+    """
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+
+    options = {"lossless": True} if image_format == "WEBP" else {}
+    if compress_level is not None and image_format == "PNG":
+        options["compress_level"] = compress_level
+
+    buffered = BytesIO()
+    image.save(buffered, format=image_format, **options)  # type: ignore
+    return f"data:image/{image_format.lower()};base64," + base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+
+def cached_data_uri(image: np.ndarray | object, cache_key=None, image_format: str = "PNG",
+                    compress_level: int | None = None) -> str:
+    """
+    Retrieve the data URI of an image from the LRU cache, encoding it on a miss.
+    cache_key replaces the pixel fingerprint, e.g. with a sprite tile key.
+    """
+    global _uri_cache_bytes
+
+    key = (cache_key if cache_key is not None else image_fingerprint(image), image_format, compress_level)
+    with _uri_cache_lock:
+        src = _uri_cache.get(key)
+        if src is not None:
+            _uri_cache.move_to_end(key)
+    cache_lookup("data_uri", src is not None)
+    if src is not None:
+        return src
+
+    # Encoded outside the lock; a session encoding the same image meanwhile replaces an identical entry
+    src = encode_image(image, image_format, compress_level)
+    with _uri_cache_lock:
+        previous = _uri_cache.pop(key, None)
+        _uri_cache[key] = src
+        _uri_cache_bytes += len(src) - len(previous or "")
+        while _uri_cache_bytes > URI_CACHE_MAX_BYTES and len(_uri_cache) > 1:
+            _, evicted = _uri_cache.popitem(last=False)
+            _uri_cache_bytes -= len(evicted)
+    return src
+
+
+def clear_uri_cache() -> None:
+    """
+    Empty the data URI cache, e.g. to time cold renders.
+    """
+    global _uri_cache_bytes
+
+    with _uri_cache_lock:
+        _uri_cache.clear()
+        _uri_cache_bytes = 0
+
+
+# Images written for Streamlit static file serving ("server.enableStaticServing"), by content key
+STATIC_DIR = Path("static/tiles")
+_static_urls: dict[tuple, str] = {}
+
+
+def static_url(file_path: Path) -> str:
+    """
+    URL of a file served from the app's static directory.
+    """
+    base_path = st.get_option("server.baseUrlPath").strip("/")
+    return f"{f'/{base_path}' if base_path else ''}/app/{file_path.as_posix()}"
+
+
+def _write_static(file_path: Path, content: bytes) -> None:
+    """
+    Write a file atomically. Sessions run as threads of one process, so each write gets its own temporary file.
+    """
+    if not file_path.exists():
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(dir=file_path.parent, suffix=".tmp", delete=False) as temp_file:
+            temp_file.write(content)
+        os.chmod(temp_file.name, 0o644)  # Temporary files are private to their owner
+        os.replace(temp_file.name, file_path)
+
+
+def static_file_url(content: bytes, directory: Path = STATIC_DIR, suffix: str = ".png") -> str:
+    """
+    Write a file once into a static directory, under its content hash, and return its URL.
+    """
+    file_path = directory / f"{hashlib.blake2b(content, digest_size=16).hexdigest()}{suffix}"
+    _write_static(file_path, content)
+    return static_url(file_path)
+
+
+def static_image_url(image: np.ndarray | object, cache_key=None) -> str:
+    """
+    Write an image once into the static directory, under the hash of its PNG encoding,
+    and return its URL. The browser can then cache it across reruns and sessions.
+    cache_key only saves encoding the image again within the process.
+    """
+    key = cache_key if cache_key is not None else image_fingerprint(image)
+    url = _static_urls.get(key)
+    cache_lookup("static_url", url is not None)
+    if url is not None:
+        return url
+
+    if isinstance(image, np.ndarray):
+        image = Image.fromarray(image)
+    buffered = BytesIO()
+    image.save(buffered, format="PNG")  # type: ignore
+
+    url = _static_urls[key] = static_file_url(buffered.getvalue())
+    return url
+
+
+def image_src(source: str | Path | np.ndarray | object, cache_key=None, image_format: str = "PNG",
+              compress_level: int | None = None, serve_static: bool = False) -> str:
+    """
+    Resolve an image source into the src sent to the frontend, a URL or a data URI.
+    URLs, data URIs and static file URLs are passed through, other strings and Paths are read as files.
+    """
+    if isinstance(source, (Path, str)):
+        if isinstance(source, str) and source.startswith(("http", "data:", static_url(Path("static")))):
+            return source
+        content = Path(source).read_bytes()
+        return "data:image/png;base64," + base64.b64encode(content).decode("utf-8")
+    elif serve_static and (hasattr(source, "save") or isinstance(source, np.ndarray)):
+        return static_image_url(source, cache_key)
+    elif hasattr(source, "save") or isinstance(source, np.ndarray):
+        return cached_data_uri(source, cache_key, image_format, compress_level)
+    raise ValueError(
+        "Must pass a string, Path, numpy array or object with a save method"
+    )
+
 
 # Create the python function that will be called
+@span()
 def clickable_image(
     source: str | Path | np.ndarray | object,
     height: int | None = None,
@@ -28,6 +186,10 @@ def clickable_image(
     key: str | None = None,
     use_column_width: UseColumnWith | str | None = None,
     tooltip: str | None = None,
+    cache_key=None,
+    image_format: str = "PNG",
+    compress_level: int | None = None,
+    serve_static: bool = False,
 ):
     """
     Display a clickable image and return a Unix timestamp when clicked.
@@ -35,7 +197,7 @@ def clickable_image(
     Parameters
     ----------
     source : str | Path | object
-        The image source
+        The image source. URLs, data URIs and static file URLs are sent as is.
     height : int | None
         The height of the image. If None, the original height will be used.
     width : int | None
@@ -50,6 +212,17 @@ def clickable_image(
         Note: if set, `use_column_width` takes precedence over the `width` parameter.
     tooltip : str | None = None
         An optional string to use as a tooltip for the widget.
+    cache_key : Hashable | None = None
+        An optional key identifying the image content, used instead of hashing its pixels
+        to look up the encoded image in the data URI cache.
+    image_format : "PNG" or "WEBP"
+        Encoding of PIL and numpy sources. WEBP is lossless, smaller and faster to encode.
+    compress_level : int | None = None
+        PNG compression level (0-9), lower levels encode faster.
+    serve_static : bool
+        If True, PIL and numpy sources are written once to the static directory
+        and sent as a short URL instead of an inline data URI.
+        Requires the "server.enableStaticServing" option.
 
     Returns
     -------
@@ -57,28 +230,9 @@ def clickable_image(
         Unix timestamp of when the image was clicked.
     """
 
-    if isinstance(source, (Path, str)):
-        if not str(source).startswith("http"):
-            content = Path(source).read_bytes()
-            src = "data:image/png;base64," + base64.b64encode(content).decode("utf-8")
-        else:
-            src = str(source)
-    elif hasattr(source, "save"):
-        buffered = BytesIO()
-        source.save(buffered, format="PNG")  # type: ignore
-        src = "data:image/png;base64,"
-        src += base64.b64encode(buffered.getvalue()).decode("utf-8")  # type: ignore
-    elif isinstance(source, np.ndarray):
-        image = Image.fromarray(source)
-        buffered = BytesIO()
-        image.save(buffered, format="PNG")  # type: ignore
-        src = "data:image/png;base64,"
-        src += base64.b64encode(buffered.getvalue()).decode("utf-8")  # type: ignore
-    else:
-        raise ValueError(
-            "Must pass a string, Path, numpy array or object with a save method"
-        )
+    src = image_src(source, cache_key, image_format, compress_level, serve_static)
 
+    payload("clickable_image", len(src) + len(tooltip or ""))
     return _component_func(
         src=src,
         height=height,
@@ -13,6 +13,7 @@ ui_layouts = {
 st_icons = {
     "home": "🏠",
     "hab": "🛰️",
+    "portfolio": "🗂️",
     "ship": "🛸",
     "info": "ℹ️",
     "upload": "🔼",
@@ -22,6 +23,7 @@ st_icons = {
 mat_icons = {
     "home": ":material/home_app_logo:",
     "hab": ":material/satellite_alt:",
+    "portfolio": ":material/folder_copy:",
     "ship": ":material/rocket_launch:",
     "info": ":material/info:",
     "upload": ":material/upload:",
@@ -42,6 +44,12 @@ farm_supply = {
     "AgricultureComplex": 3000
 }
 
+# Administration module income multipliers, only the highest one applies
+admin_bonuses = {
+    "AdministrationComplex": 1.1,
+    "AdministrationTower": 1.05
+}
+
 # Solar power output modifiers based on solar bodies
 solar_modifiers = {
     "Earth (LEO)": 1,
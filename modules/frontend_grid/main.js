@@ -0,0 +1,104 @@
+////
+// Whole habitat grid as one composited image, hit tested in the browser.
+// Cells are [label, cell type, x, y, width, height, tooltip], in pixels of the composited image,
+// listed in the slot order of the habitat.
+////
+const CORE_CELL = 2;
+const MINING_CELL = 3;
+
+let grid = {src: null, width: 1, height: 1, cells: [], frames: {}};
+let selected = null;
+
+function cellAt(event) {
+    const img = document.getElementById("image");
+    const rect = img.getBoundingClientRect();
+    const x = (event.clientX - rect.left) * grid.width / rect.width;
+    const y = (event.clientY - rect.top) * grid.height / rect.height;
+    return grid.cells.find(([, , cx, cy, cw, ch]) => x >= cx && x < cx + cw && y >= cy && y < cy + ch) || null;
+}
+
+function placeOverlay(element, cell) {
+    if (!cell) {
+        element.classList.add("hidden");
+        return;
+    }
+    const [, , x, y, w, h] = cell;
+    element.style.left = `${100 * x / grid.width}%`;
+    element.style.top = `${100 * y / grid.height}%`;
+    element.style.width = `${100 * w / grid.width}%`;
+    element.style.height = `${100 * h / grid.height}%`;
+    element.classList.remove("hidden");
+}
+
+function showSelection() {
+    const frame = document.getElementById("frame");
+    const cell = grid.cells.find(([label]) => label === selected);
+    if (cell && cell[1] !== CORE_CELL) {
+        const src = cell[1] === MINING_CELL && cell[4] > cell[5] ? grid.frames.wide : grid.frames.square;
+        if (frame.getAttribute("src") !== src) {
+            frame.src = src;
+        }
+        placeOverlay(frame, cell);
+    } else {
+        placeOverlay(frame, null);
+    }
+}
+
+function sendClick(cell, button) {
+    Streamlit.setComponentValue({slot: grid.cells.indexOf(cell), label: cell[0], button: button, time: Date.now()});
+}
+
+function onRender(event) {
+    const {src, width, height, cells, frames} = event.detail.args;
+    const img = document.getElementById("image");
+
+    // A new image means the placed modules changed, which ends the cell selection
+    if (src !== grid.src) {
+        img.src = src;
+        selected = null;
+    }
+    grid = {src, width, height, cells, frames};
+    showSelection();
+
+    img.onload = () => Streamlit.setFrameHeight();
+    Streamlit.setFrameHeight();
+}
+
+window.addEventListener("resize", () => Streamlit.setFrameHeight());
+
+window.addEventListener("load", () => {
+    const img = document.getElementById("image");
+    const hover = document.getElementById("hover");
+
+    img.onmousemove = function(e) {
+        const cell = cellAt(e);
+        placeOverlay(hover, cell);
+        this.title = cell ? cell[6] || "" : "";
+    };
+    img.onmouseleave = () => placeOverlay(hover, null);
+
+    // Left click selects the cell and sends its label to Python
+    img.onclick = function(e) {
+        const cell = cellAt(e);
+        if (cell) {
+            selected = cell[0];
+            showSelection();
+            sendClick(cell, "left");
+        }
+    };
+
+    // Right click empties the cell, without the context menu
+    img.oncontextmenu = function(e) {
+        e.preventDefault();
+        const cell = cellAt(e);
+        if (cell) {
+            sendClick(cell, "right");
+        }
+        return false;
+    };
+});
+
+// Render the component whenever python sends a "render event"
+Streamlit.events.addEventListener(Streamlit.RENDER_EVENT, onRender)
+// Tell Streamlit that the component is ready to receive events
+Streamlit.setComponentReady()
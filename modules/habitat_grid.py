@@ -0,0 +1,122 @@
+import streamlit.components.v1 as components
+
+from functools import lru_cache
+from pathlib import Path
+from PIL import Image
+
+from modules.clickable_image import image_src, static_file_url
+from modules.constants import ModuleData, habitat_layouts
+from modules.habitat_module import module_tooltip, sprite_tile, tile_key
+from modules.habitat_slots import EMPTY, habitat_table
+from modules.module_catalog import ModuleCatalog
+from modules.profiling import cache_lookup, payload, span
+
+# The whole habitat grid is one component: a composited image of the module tiles, and the cell map
+# the browser hit tests clicks against
+frontend_dir = (Path(__file__).parent / "frontend_grid").absolute()
+_component_func = components.declare_component(
+    "streamlit_habitat_grid", path=str(frontend_dir)
+)
+
+TILE_SIZE = 128
+# Relative column widths of the first Base row, around a wide mining module
+MINING_ROW_WEIGHTS = (1, 0.25, 0.25, 4, 0.25, 0.25, 1)
+
+
+@lru_cache(maxsize=None)
+def grid_layout(hab_type: str, tier: int, wide_mining: bool = False) -> tuple[int, int, tuple]:
+    """
+    Pixel geometry of a habitat layout: the image width and height,
+    and a (label, cell type, x, y, width, height) box per cell, in slot order.
+    """
+    layout = habitat_layouts[hab_type][tier]
+    width = max(len(row) for row in layout) * TILE_SIZE
+    boxes = []
+    for row_idx, row in enumerate(layout):
+        weights = MINING_ROW_WEIGHTS if row_idx == 0 and hab_type == "Base" and wide_mining else (1,) * len(row)
+        x = 0
+        for col_idx, (cell, weight) in enumerate(zip(row, weights)):
+            cell_width = int(weight * width / sum(weights))
+            if cell != 0:
+                boxes.append((f"{row_idx}_{col_idx}", cell, x, row_idx * TILE_SIZE, cell_width, TILE_SIZE))
+            x += cell_width
+    return width, len(layout) * TILE_SIZE, tuple(boxes)
+
+
+def compose_grid(width: int, height: int, boxes: tuple, keys: tuple) -> Image:
+    """
+    Paste the sprite tiles of the cells into one transparent image, scaled to their boxes.
+    """
+    image = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    for (_, _, x, y, w, h), key in zip(boxes, keys):
+        tile = sprite_tile(*key)
+        if tile.size != (w, h):
+            tile = tile.resize((w, h))
+        image.alpha_composite(tile, (x, y))
+    return image
+
+
+@lru_cache(maxsize=None)
+def frame_sources(serve_static: bool = False) -> dict[str, str]:
+    """
+    Sources of the selection frames, drawn over the selected cell by the browser:
+    static file URLs when serve_static, data URIs otherwise.
+    """
+    paths = {"square": Path("data/misc/frame.png"), "wide": Path("data/misc/frame_wide.png")}
+    if serve_static:
+        return {name: static_file_url(path.read_bytes()) for name, path in paths.items()}
+    return {name: image_src(path) for name, path in paths.items()}
+
+
+@span()
+def grid_render(core: ModuleData, state, all_modules: ModuleCatalog, serve_static: bool = False) -> dict:
+    """
+    Component arguments of the habitat grid, reused from the previous rerun while no cell tile changed.
+    The selection is drawn by the browser, so selecting a cell sends the same arguments again.
+    """
+    table, slots = habitat_table(state.habitat), state.habitat["slots"]
+    mining_module = all_modules.names[slots[table.mining_slot]] \
+        if table.mining_slot != EMPTY and slots[table.mining_slot] != EMPTY else None
+    wide_mining = mining_module is not None and "Mining" in mining_module
+    width, height, boxes = grid_layout(core["habType"], core["tier"], wide_mining)
+
+    keys = tuple(tile_key(core, slot, state, all_modules)[:-1] + (False,) for slot in range(len(boxes)))
+
+    rendered = state.get("grid_render")
+    cache_lookup("grid_render", rendered is not None and rendered[0] == (keys, serve_static))
+    if rendered is None or rendered[0] != (keys, serve_static):
+        # Every edit makes a new composite, so it goes through the size bounded data URI cache
+        src = image_src(compose_grid(width, height, boxes, keys), cache_key=("grid", boxes, keys))
+        args = {"src": src, "width": width, "height": height, "frames": frame_sources(serve_static),
+                "cells": [[label, cell, x, y, w, h, module_tooltip(slot, state, all_modules)]
+                          for slot, (label, cell, x, y, w, h) in enumerate(boxes)]}
+        rendered = state.grid_render = ((keys, serve_static), args)
+    return rendered[1]
+
+
+@span()
+def habitat_grid(core: ModuleData, state, all_modules: ModuleCatalog, key: str | None = None,
+                 serve_static: bool = False) -> dict | None:
+    """
+    Display the habitat grid and return its last click, as {"slot", "label", "button", "time"},
+    the slot indexing the habitat slot array, the button being "left" or "right"
+    and the time a Unix timestamp in milliseconds.
+
+    Parameters
+    ----------
+    core : ModuleData
+        The habitat core module, selecting the layout of habitat_layouts.
+    state : SessionState
+        Session state holding the habitat slots and the clicked slot.
+    all_modules : ModuleCatalog
+        The module catalog, for tooltips and tiers.
+    key : str | None = None
+        An optional string to use as the unique key for the widget.
+    serve_static : bool
+        If True, the selection frames are written once to the static directory and sent as short URLs.
+        Requires the "server.enableStaticServing" option. The composited image changes with every edit,
+        so it is always sent as a data URI.
+    """
+    args = grid_render(core, state, all_modules, serve_static)
+    payload("habitat_grid", len(args["src"]) + sum(len(cell[-1]) for cell in args["cells"]))
+    return _component_func(key=key, default=None, **args)
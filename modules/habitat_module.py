@@ -1,7 +1,32 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+from pathlib import Path
 from PIL import Image
 
 from modules.habitat_stats import format_number
-from modules.constants import ModuleData
+from modules.constants import ModuleData, pretty_stats
+from modules.habitat_slots import CORE_CELL, EMPTY, MINING_CELL, habitat_table
+from modules.module_catalog import ModuleCatalog
+from modules.module_template import TEMPLATE_PATH
+from modules.profiling import cache_lookup, span
+
+
+SPRITES_PATH = "_resources/sprites"
+ATLAS_PATH = "_resources/sprite_atlas.npz"
+
+# Resize Module Sprite based on Tier
+tier_sizes = {
+    1: {1: 1.0},
+    2: {1: 0.7, 2: 1.0},
+    3: {1: 0.4, 2: 0.7, 3: 1.0}
+}
+
+# Composited module tiles, keyed by (habType, core tier, module, module tier, wide, selected)
+_tiles: dict[tuple, Image.Image] = {}
+_atlas_checked = False
 
 
 def add_frame(module_sprite: Image, wide: bool = False) -> Image:
@@ -15,33 +40,22 @@ def add_frame(module_sprite: Image, wide: bool = False) -> Image:
     return Image.alpha_composite(frame, module_sprite)
 
 
-def module_image(core: ModuleData, label: str, state, all_modules):
+@span()
+def render_tile(hab_type: str, core_tier: int, module: str | None, module_tier: int,
+                wide: bool, selected: bool) -> Image:
     """
-    Determine the appropriate image for a module based on its state.
-    Returns a numpy array of the image.
+    Load, rescale and composite a module sprite onto its transparent cell tile.
+    A module of None is the empty cell sprite.
     """
-    cell = state.habitat["cells"][label]
-
-    if label in state:
-        cell[-1] = None if state[label] == 0 else cell[-1]
+    if module is None:
+        image_path = f"{SPRITES_PATH}/T{core_tier}_Empty_Module.png"
+    else:
+        image_path = f"{SPRITES_PATH}/{hab_type}_T{module_tier}_{module}.png"
 
     try:
-        if cell[-1] is None:
-            if cell[0] == 2:
-                image_file = f"{state.habitat['type']}_T{core['tier']}_{core['dataName']}"
-                state.habitat["cells"][label][-1] = core["dataName"]
-                image_path = f"_resources/sprites/{image_file}.png"
-            else:
-                image_path = f"_resources/sprites/T{core['tier']}_Empty_Module.png"
-
-        else:
-            sprite = f"{state.habitat['type']}_T{all_modules[cell[-1]]['tier']}_{cell[-1]}.png"
-            image_path = f"_resources/sprites/{sprite}"
-
         module_sprite = Image.open(image_path)
     except FileNotFoundError:
-        image_path = "data/misc/missing_sprite.png"
-        module_sprite = Image.open(image_path)
+        module_sprite = Image.open("data/misc/missing_sprite.png")
 
     # if not image_path.endswith("_Empty_Module.png") and cell[0] != 3 and core["tier"] != 3:
     #     if label.startswith("0_"):
@@ -51,18 +65,10 @@ def module_image(core: ModuleData, label: str, state, all_modules):
     #     elif label in ["1_4", "1_5", "1_6"]:
     #         module_sprite = module_sprite.rotate(90)
 
-    base_size = (512, 128) if cell[0] == 3 and cell[-1] else (128, 128)
+    base_size = (512, 128) if wide else (128, 128)
     sprite_base = Image.new('RGBA', base_size, (0, 0, 0, 0))
 
-    # Resize Module Sprite based on Tier
-    tier_sizes = {
-        1: {1: 1.0},
-        2: {1: 0.7, 2: 1.0},
-        3: {1: 0.4, 2: 0.7, 3: 1.0}
-    }
-
-    module_tier = all_modules[cell[-1]]['tier'] if cell[-1] else core['tier']
-    max_dimension = int(base_size[0] * tier_sizes[core["tier"]][module_tier])
+    max_dimension = int(base_size[0] * tier_sizes[core_tier][module_tier])
     scale = min(max_dimension / module_sprite.width, max_dimension / module_sprite.height)
     new_size = (int(module_sprite.width * scale), int(module_sprite.height * scale))
 
@@ -72,41 +78,164 @@ def module_image(core: ModuleData, label: str, state, all_modules):
     y = (base_size[1] - module_sprite.height) // 2
     sprite_base.paste(im=module_sprite, box=(x, y), mask=module_sprite)
 
-    if label == state.clicked_cell and cell[0] != 2:
-        return add_frame(sprite_base, wide=True if cell[0] == 3 and cell[-1] else False)
-
-    return sprite_base
-
-
-def module_tooltip(label: str, state, all_modules) -> str:
-    if state.habitat["cells"][label][-1] is None:
-        return "Empty Module"
-
-    pretty_names = {
-        "power": "Power",
-        "money": "Money",
-        "incomeResearch_month": "Research",
-        "boost": "Boost",
-        "missionControl": "Mission Control",
-        "water": "Water",
-        "volatiles": "Volatiles",
-        "metals": "Metals",
-        "nobleMetals": "Noble Metals",
-        "fissiles": "Fissiles",
-        "incomeMoney_month": "Money",
-        "incomeAntimatter_month": "Antimatter",
-        "incomeProjects": "Projects",
-        "incomeInfluence_month": "Influence",
-        "incomeOps_month": "Ops",
-    }
-
-    module_name = state.habitat["cells"][label][-1]
+    return add_frame(sprite_base, wide=wide) if selected else sprite_base
+
+
+def sprite_tile(*key) -> Image:
+    """
+    Retrieve a composited module tile from the process-wide cache, rendering it on a miss.
+    The returned image is shared, and must not be modified.
+    """
+    global _atlas_checked
+    if not _atlas_checked:
+        _atlas_checked = True
+        if os.path.exists(ATLAS_PATH):
+            load_sprite_atlas()
+
+    tile = _tiles.get(key)
+    cache_lookup("sprite_tile", tile is not None)
+    if tile is None:
+        tile = _tiles[key] = render_tile(*key)
+    return tile
+
+
+def tile_key(core: ModuleData, slot: int, state, all_modules: ModuleCatalog) -> tuple:
+    """
+    Resolve a habitat slot into a sprite tile key.
+    """
+    table = habitat_table(state.habitat)
+    module_id = int(state.habitat["slots"][slot])
+    cell = table.cell_types[slot]
+
+    module = all_modules.names[module_id] if module_id != EMPTY else None
+    module_tier = all_modules.tiers[module] if module else core["tier"]
+    wide = bool(cell == MINING_CELL and module)
+    selected = slot == state.clicked_cell and cell != CORE_CELL
+
+    return state.habitat["type"], core["tier"], module, module_tier, wide, selected
+
+
+@span()
+def module_image(core: ModuleData, slot: int, state, all_modules: ModuleCatalog):
+    """
+    Determine the appropriate image for a module based on its state.
+    Returns a cached PIL image of the composited tile.
+    """
+    return sprite_tile(*tile_key(core, slot, state, all_modules))
+
+
+def atlas_keys(all_modules: dict[str, ModuleData]):
+    """
+    Every tile key the planner can request, for each habitat type and core tier.
+    """
+    for hab_type in ("station", "base"):
+        for core_tier in tier_sizes:
+            for selected in (False, True):
+                yield hab_type, core_tier, None, core_tier, False, selected
+
+            for name, module in all_modules.items():
+                if module["habType"] not in (hab_type.title(), "Any") or module["tier"] > core_tier:
+                    continue
+                if module["coreModule"]:
+                    if module["tier"] == core_tier:
+                        yield hab_type, core_tier, name, core_tier, False, False
+                    continue
+                for selected in (False, True):
+                    yield hab_type, core_tier, name, module["tier"], False, selected
+                    if module["mine"]:
+                        yield hab_type, core_tier, name, module["tier"], True, selected
+
+
+def atlas_fingerprint() -> str:
+    """
+    Hash of the sources the tiles are rendered from: the sprite and frame files, by name, size and
+    modification time, the module template the catalog is loaded from, and the tile sizes.
+    """
+    digest = hashlib.blake2b(json.dumps(tier_sizes).encode(), digest_size=8)
+    sources = sorted(Path(SPRITES_PATH).glob("*.png")) + sorted(Path("data/misc").glob("*.png")) + [TEMPLATE_PATH]
+    for source in map(Path, sources):
+        if source.exists():
+            stat = source.stat()
+            digest.update(f"{source.as_posix()}:{stat.st_size}:{stat.st_mtime_ns}\n".encode())
+    return digest.hexdigest()
+
+
+def build_sprite_atlas(all_modules: dict[str, ModuleData], path: str = ATLAS_PATH) -> int:
+    """
+    Pre-render every module tile into a compressed NumPy archive, with the fingerprint of its sources.
+    Returns the number of tiles written.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    keys = list(atlas_keys(all_modules))
+    tiles = {f"tile_{i}": np.asarray(render_tile(*key)) for i, key in enumerate(keys)}
+    np.savez_compressed(path, keys=np.array(json.dumps(keys)), fingerprint=np.array(atlas_fingerprint()), **tiles)
+    return len(keys)
+
+
+def load_sprite_atlas(path: str = ATLAS_PATH) -> bool:
+    """
+    Fill the tile cache from a pre-rendered sprite atlas.
+    An atlas rendered from other sprites or module data is ignored, its tiles then being rendered on demand.
+    Returns whether the atlas was loaded.
+    """
+    with np.load(path) as atlas:
+        if "fingerprint" not in atlas.files or str(atlas["fingerprint"]) != atlas_fingerprint():
+            return False
+        for i, key in enumerate(json.loads(str(atlas["keys"]))):
+            _tiles[tuple(key)] = Image.fromarray(atlas[f"tile_{i}"])
+    return True
+
+
+def filter_modules(core: ModuleData, filters: list[str], all_modules: ModuleCatalog,
+                   mining_cell: bool = False) -> dict[str, ModuleData]:
+    """
+    Filter out modules based on core tier and user choice: "All Modules", "Tier <n>" and pretty_stats incomes.
+    Returns a dictionary of filtered modules.
+    """
+    income_filters = [pretty_stats[f] for f in filters if f in pretty_stats]
+    tier_filters = [f for f in filters if f.startswith("Tier")]
+    if not tier_filters or "All Modules" in filters:
+        tiers = range(1, core["tier"] + 1)
+    else:
+        tiers = {int(f.split()[-1]) for f in tier_filters}
+
+    mods = all_modules.select(hab_types=(core["habType"], "Any"), tiers=tiers, core=False,
+                              incomes=income_filters, mining=True if mining_cell else None)
+    return {k: all_modules[k] for k in mods}
+
+
+EMPTY_TOOLTIP = "Empty Module"
+
+tooltip_names = {
+    "power": "Power",
+    "money": "Money",
+    "incomeResearch_month": "Research",
+    "boost": "Boost",
+    "missionControl": "Mission Control",
+    "water": "Water",
+    "volatiles": "Volatiles",
+    "metals": "Metals",
+    "nobleMetals": "Noble Metals",
+    "fissiles": "Fissiles",
+    "incomeMoney_month": "Money",
+    "incomeAntimatter_month": "Antimatter",
+    "incomeProjects": "Projects",
+    "incomeInfluence_month": "Influence",
+    "incomeOps_month": "Ops",
+}
+tooltip_order = {k: i for i, k in enumerate(tooltip_names)}
+
+
+def build_tooltip(module_name: str, all_modules: ModuleCatalog) -> str:
+    """
+    Build the tooltip text of a module, from its static data only.
+    """
     module_stat = all_modules[module_name]
 
     # Tooltip bit: Monthly Incomes and Bonuses
-    relevant_items = [(k, v) for k, v in module_stat.items() if k in pretty_names and v > 0]
-    sorted_incomes = sorted(relevant_items, key=lambda x: list(pretty_names.keys()).index(x[0]))
-    incomes_bonuses = ", ".join([f"{pretty_names[k]}: {v if k == 'incomeAntimatter_month' else format_number(v)}"
+    relevant_items = [(k, v) for k, v in module_stat.items() if k in tooltip_names and v > 0]
+    sorted_incomes = sorted(relevant_items, key=lambda x: tooltip_order[x[0]])
+    incomes_bonuses = ", ".join([f"{tooltip_names[k]}: {v if k == 'incomeAntimatter_month' else format_number(v)}"
                                  for k, v in sorted_incomes if v > 0])
 
     tech_bonuses = ", ".join([f"{tech['category']}: {format_number(tech['bonus'] * 100)}%"
@@ -118,17 +247,17 @@ def module_tooltip(label: str, state, all_modules) -> str:
     power_cost = f"Power: {module_stat['power']}, " if module_stat["power"] < 0 else ""
 
     crew_costs = (module_stat["crew"] * 7 / 240)
-    total_costs = module_stat["supportMaterials_month"].copy()
-    total_costs["water"] = total_costs.get("water", 0) + crew_costs
-    total_costs["volatiles"] = total_costs.get("volatiles", 0) + crew_costs
+    total_costs = dict(module_stat["supportMaterials_month"],
+                       water=module_stat["supportMaterials_month"].get("water", 0) + crew_costs,
+                       volatiles=module_stat["supportMaterials_month"].get("volatiles", 0) + crew_costs)
 
-    sorted_costs = sorted(total_costs.items(), key=lambda x: list(pretty_names.keys()).index(x[0]))
-    support_costs = ", ".join([f"{pretty_names[k]}: -{format_number(v)}" for k, v in sorted_costs if v != 0])
+    sorted_costs = sorted(total_costs.items(), key=lambda x: tooltip_order[x[0]])
+    support_costs = ", ".join([f"{tooltip_names[k]}: -{format_number(v)}" for k, v in sorted_costs if v != 0])
 
     # Main tooltip
     tooltip = f"""\
-{module_stat['friendlyName']}
-Tier {module_stat['tier']} module, {module_stat['crew']} crew, {module_stat['baseMass_tons']} tons
+{all_modules.friendly_names[module_name]}
+Tier {all_modules.tiers[module_name]} module, {module_stat['crew']} crew, {module_stat['baseMass_tons']} tons
 
 Monthly Incomes and Bonuses:
 {incomes_bonuses}
@@ -136,3 +265,26 @@ Monthly Support Costs:
 {power_cost}{support_costs}"""
 
     return tooltip
+
+
+@span()
+def module_tooltip(slot: int, state, all_modules: ModuleCatalog) -> str:
+    """
+    Tooltip of the module in a habitat slot, built once per module dataName.
+    """
+    module_id = int(state.habitat["slots"][slot])
+    if module_id == EMPTY:
+        return EMPTY_TOOLTIP
+
+    module_name = all_modules.names[module_id]
+    tooltip = all_modules.tooltips.get(module_name)
+    cache_lookup("module_tooltip", tooltip is not None)
+    if tooltip is None:
+        tooltip = all_modules.tooltips[module_name] = build_tooltip(module_name, all_modules)
+    return tooltip
+
+
+if __name__ == "__main__":
+    from modules.utilities import load_module_data
+
+    print(f"Sprite atlas: {build_sprite_atlas(load_module_data())} tiles written to {ATLAS_PATH}")
@@ -0,0 +1,213 @@
+import base64
+import binascii
+import struct
+import numpy as np
+
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+
+from modules import constants as c
+from modules.module_catalog import RESOURCES
+
+EMPTY = -1  # Module id of an empty slot
+MODULE_CELL = 1
+CORE_CELL = 2
+MINING_CELL = 3
+
+BODIES = tuple(c.solar_modifiers)
+
+# Habitat codes: a header of format version, module catalog fingerprint, type and tier, and system body;
+# a module position byte per slot; the site resources of bases in hundredths; then the UTF-8 name
+CODE_VERSION = 1
+CODE_HEADER = struct.Struct(">BHBB")
+CODE_SITE = struct.Struct(f">{len(RESOURCES)}H")
+CODE_EMPTY = 255
+SITE_SCALE = 100
+
+
+@dataclass(frozen=True, slots=True, eq=False)
+class SlotTable:
+    """
+    The cells of a habitat layout in a fixed row-major slot order.
+    A habitat of the layout is an array holding the module id of each slot,
+    the module position in the catalog, or EMPTY.
+    """
+    hab_type: str
+    tier: int
+    labels: tuple[str, ...]  # "row_col" label of each slot, as in the JSON save format
+    cell_types: np.ndarray
+    index: MappingProxyType  # Slot of each label
+    core_slot: int
+    mining_slot: int  # EMPTY when the layout has no mining cell
+
+    @classmethod
+    def from_layout(cls, hab_type: str, tier: int) -> "SlotTable":
+        cells = [(f"{row_idx}_{col_idx}", cell) for row_idx, row in enumerate(c.habitat_layouts[hab_type][tier])
+                 for col_idx, cell in enumerate(row) if cell != 0]
+        labels = tuple(label for label, _ in cells)
+        cell_types = np.array([cell for _, cell in cells], dtype=np.int8)
+        cell_types.flags.writeable = False
+        mining = np.flatnonzero(cell_types == MINING_CELL)
+        return cls(hab_type=hab_type, tier=tier, labels=labels, cell_types=cell_types,
+                   index=MappingProxyType({label: i for i, label in enumerate(labels)}),
+                   core_slot=int(np.flatnonzero(cell_types == CORE_CELL)[0]),
+                   mining_slot=int(mining[0]) if len(mining) else EMPTY)
+
+    def empty(self, core_id: int = EMPTY) -> np.ndarray:
+        """
+        Slot array of a habitat holding only its core module.
+        """
+        slots = np.full(len(self.labels), EMPTY, dtype=np.int16)
+        slots[self.core_slot] = core_id
+        return slots
+
+
+@lru_cache(maxsize=None)
+def slot_table(hab_type: str, tier: int) -> SlotTable:
+    """
+    Slot table of a habitat layout, compiled once. hab_type is "Station" or "Base", in any case.
+    """
+    return SlotTable.from_layout(hab_type.title(), tier)
+
+
+def habitat_table(habitat: dict) -> SlotTable:
+    return slot_table(habitat["type"], habitat["tier"])
+
+
+def cells_to_slots(table: SlotTable, cells: dict[str, list], position: dict[str, int]) -> np.ndarray:
+    """
+    Convert the "row_col" cells dictionary of the JSON save format into a slot array.
+    Cells outside the layout and unknown modules are left empty.
+    """
+    slots = table.empty()
+    for label, cell in cells.items():
+        if label in table.index and cell[-1] in position:
+            slots[table.index[label]] = position[cell[-1]]
+    return slots
+
+
+def slots_to_cells(table: SlotTable, slots: np.ndarray, names: list[str]) -> dict[str, list]:
+    """
+    Convert a slot array back into the "row_col" cells dictionary of the JSON save format.
+    """
+    return {label: [cell, names[m] if m != EMPTY else None]
+            for label, cell, m in zip(table.labels, table.cell_types.tolist(), slots.tolist())}
+
+
+def load_habitat(data: dict, all_modules) -> dict:
+    """
+    Convert a habitat of the JSON save format into the planner's, storing its cells as a slot array.
+    """
+    habitat = {k: v for k, v in data.items() if k != "cells"}
+    table = habitat_table(habitat)
+    habitat["slots"] = cells_to_slots(table, data.get("cells", {}), all_modules.position)
+    if habitat["slots"][table.core_slot] == EMPTY and habitat.get("core") in all_modules.position:
+        habitat["slots"][table.core_slot] = all_modules.position[habitat["core"]]
+    return habitat
+
+
+def save_habitat(habitat: dict, all_modules) -> dict:
+    """
+    Convert a planner habitat into the JSON save format, with its cells as a "row_col" dictionary.
+    """
+    if "slots" not in habitat:
+        return habitat
+    cells = slots_to_cells(habitat_table(habitat), habitat["slots"], all_modules.names)
+    return {"cells": cells, **{k: v for k, v in habitat.items() if k != "slots"}}
+
+
+@lru_cache(maxsize=None)
+def code_lookup(n_modules: int) -> np.ndarray:
+    """
+    Slot module ids of the bytes of a habitat code, for a catalog of n_modules.
+    """
+    lookup = np.full(256, EMPTY, dtype=np.int16)
+    lookup[:n_modules] = np.arange(n_modules)
+    lookup.flags.writeable = False
+    return lookup
+
+
+_cell_choices: dict[tuple[SlotTable, int], tuple[object, np.ndarray]] = {}
+
+
+def cell_choices(table: SlotTable, all_modules) -> np.ndarray:
+    """
+    Modules each cell type of a layout can hold, as offered by the planner: a read-only (cell types, modules) mask,
+    built once per layout and module catalog, with a last column for EMPTY, allowed everywhere.
+    The core cell holds a core of the layout type and tier, other cells non-core modules of the layout type,
+    or "Any", up to its tier, mining cells only mining modules.
+    """
+    cached = _cell_choices.get((table, id(all_modules)))
+    if cached is None or cached[0] is not all_modules:
+        choices = np.zeros((MINING_CELL + 1, len(all_modules.names) + 1), dtype=bool)
+        choices[:, EMPTY] = True
+        hab_types, tiers = (table.hab_type, "Any"), range(1, table.tier + 1)
+        for cell, names in (
+                (CORE_CELL, all_modules.select(hab_types=(table.hab_type,), tiers=(table.tier,), core=True)),
+                (MODULE_CELL, all_modules.select(hab_types=hab_types, tiers=tiers, core=False)),
+                (MINING_CELL, all_modules.select(hab_types=hab_types, tiers=tiers, core=False, mining=True))):
+            choices[cell, [all_modules.position[name] for name in names]] = True
+        choices.flags.writeable = False
+        cached = _cell_choices[(table, id(all_modules))] = (all_modules, choices)
+    return cached[1]
+
+
+def encode_habitat(habitat: dict, all_modules) -> str:
+    """
+    Pack a planner habitat into a short base64url code, for links and small payloads.
+    Site resources are rounded to hundredths, and clamped to 0 - 655.35.
+    """
+    if len(all_modules.names) >= CODE_EMPTY:
+        raise ValueError("Too many modules for habitat codes")
+    table = habitat_table(habitat)
+    slots = np.asarray(habitat["slots"])
+    data = CODE_HEADER.pack(CODE_VERSION, all_modules.fingerprint, (table.hab_type == "Base") << 7 | table.tier,
+                            BODIES.index(habitat.get("body", BODIES[0])))
+    data += np.where(slots == EMPTY, CODE_EMPTY, slots).astype(np.uint8).tobytes()
+    if table.hab_type == "Base":
+        site = habitat.get("site") or {}
+        data += CODE_SITE.pack(*(min(max(0, round(site.get(r, 0) * SITE_SCALE)), 0xFFFF) for r in RESOURCES))
+    return base64.urlsafe_b64encode(data + habitat.get("name", "").encode()).rstrip(b"=").decode()
+
+
+def decode_habitat(code: str, all_modules) -> dict:
+    """
+    Unpack a habitat code of encode_habitat into a planner habitat. Unknown modules are left empty.
+    Raises ValueError for malformed codes, codes of another module catalog, and modules the planner
+    wouldn't place in their cell, see cell_choices.
+    """
+    try:
+        data = base64.urlsafe_b64decode(code + "=" * (-len(code) % 4))
+        version, fingerprint, kind, body = CODE_HEADER.unpack_from(data)
+    except (binascii.Error, struct.error) as e:
+        raise ValueError(f"Invalid habitat code {code!r}") from e
+    if version != CODE_VERSION:
+        raise ValueError(f"Unknown habitat code version {version}")
+    if fingerprint != all_modules.fingerprint:
+        raise ValueError("The habitat code was made with other module data")
+
+    try:
+        table = slot_table("Base" if kind >> 7 else "Station", kind & 0x7F)
+        offset = CODE_HEADER.size + len(table.labels)
+        slots = code_lookup(len(all_modules.names))[np.frombuffer(data, dtype=np.uint8, count=len(table.labels),
+                                                                  offset=CODE_HEADER.size)]
+        habitat = {"slots": slots, "core": None, "tier": table.tier, "type": table.hab_type.lower(),
+                   "body": BODIES[body]}
+        if table.hab_type == "Base":
+            habitat["site"] = {r: v / SITE_SCALE for r, v in zip(RESOURCES, CODE_SITE.unpack_from(data, offset))}
+            offset += CODE_SITE.size
+    except (struct.error, KeyError, IndexError, ValueError) as e:
+        raise ValueError(f"Invalid habitat code {code!r}") from e
+    if slots[table.core_slot] == EMPTY:
+        raise ValueError(f"Invalid habitat code {code!r}: no core module")
+    allowed = cell_choices(table, all_modules)[table.cell_types, slots]
+    if not allowed.all():
+        invalid = int(np.argmin(allowed))
+        raise ValueError(f"Invalid habitat code {code!r}: {all_modules.names[slots[invalid]]} "
+                         f"can't be placed in cell {table.labels[invalid]}")
+
+    habitat["core"] = all_modules.names[slots[table.core_slot]]
+    if offset < len(data):
+        habitat["name"] = data[offset:].decode(errors="replace")
+    return habitat
@@ -1,7 +1,13 @@
 import base64
+import numpy as np
 import streamlit as st
 
+from functools import lru_cache
+from pathlib import Path
 from modules import constants as c
+from modules.clickable_image import static_file_url
+from modules.profiling import span
+from modules.stats_engine import RESOURCES, StatsAccumulator, compute_habitat_stats, get_engine, habitat_cells
 
 
 def get_default_stats() -> c.HabStats:
@@ -38,16 +44,32 @@ def format_number(value: float, precision: int = 1) -> float | int:
     return value.__round__(precision) if value % 1 else int(value)
 
 
-def get_base64_image(stat: str, path="_resources/icons", height=15) -> str:
+@lru_cache(maxsize=None)
+def icon_source(stat: str, path="_resources/icons") -> str | None:
     """
-    Create an icon image to display inline with text.
+    Load an icon once, as a data URI or a static URL when static file serving is enabled.
+    Missing icons are remembered as None.
     """
     try:
         with open(f"{path}/{stat}.png", "rb") as f:
-            encoded_data = base64.b64encode(f.read()).decode()
+            content = f.read()
     except FileNotFoundError:
+        return None
+
+    if st.get_option("server.enableStaticServing"):
+        return static_file_url(content, directory=Path("static/icons"))
+    return f"data:image/png;base64,{base64.b64encode(content).decode()}"
+
+
+@lru_cache(maxsize=None)
+def get_base64_image(stat: str, path="_resources/icons", height=15) -> str:
+    """
+    Create an icon image to display inline with text.
+    """
+    src = icon_source(stat, path)
+    if src is None:
         return stat
-    return f"<img src='data:image/png;base64,{encoded_data}' style='height:{height}px;width:auto;'>"
+    return f"<img src='{src}' style='height:{height}px;width:auto;'>"
 
 
 def format_resource_string(data_dict, resources=("water", "volatiles", "metals", "nobleMetals", "fissiles")):
@@ -55,27 +77,57 @@ def format_resource_string(data_dict, resources=("water", "volatiles", "metals",
                      for res in resources)
 
 
-def construction_bonus(t3_count: int, t2_count: int, t1_count: int) -> float:
-    bonuses = (
-        (t3_count, 0.40, (1, 0.15, 0.06, 0.028)),
-        (t2_count, 0.25, (1, 0.18, 0.08, 0.040)),
-        (t1_count, 0.10, (1, 0.20, 0.10, 0.050)),
-    )  # T3, T2, T1 bonus = 40%, 25%, 10%; diminishing returns tuple
+CONSTRUCTION_BONUSES = (
+    (0.40, (1, 0.15, 0.06, 0.028)),
+    (0.25, (1, 0.18, 0.08, 0.040)),
+    (0.10, (1, 0.20, 0.10, 0.050)),
+)  # T3, T2, T1 bonus = 40%, 25%, 10%; diminishing returns tuple
 
-    total_bonus = 0.0
-    applied_bonuses = 0  # Track how many bonuses have been applied
-    highest_tier_coeffs = None  # Store the coefficients of the highest tier applied
+# Most modules of a single tier a habitat can hold
+MAX_CONSTRUCTION_MODULES = max(sum(cell != 0 for row in layout for cell in row)
+                               for layouts in c.habitat_layouts.values() for layout in layouts.values())
 
-    for count, base_bonus, coeffs in bonuses:
-        if count > 0 and highest_tier_coeffs is None:  # Determine the highest tier and use those coefficients
-            highest_tier_coeffs = coeffs
 
-        for _ in range(count):  # Highest module tier adds full bonus; subsequent bonuses are diminished
-            coeff_index = min(applied_bonuses, len(highest_tier_coeffs) - 1)
-            total_bonus += base_bonus * highest_tier_coeffs[coeff_index]
-            applied_bonuses += 1
+@lru_cache(maxsize=None)
+def construction_bonus_table(size: int = MAX_CONSTRUCTION_MODULES + 1) -> np.ndarray:
+    """
+    Construction bonus of every (T3, T2, T1) count triple below size.
+    Highest module tier adds full bonus; subsequent bonuses are diminished by its coefficients.
+    Entries are summed one module at a time in T3, T2, T1 order, the same float operations as adding
+    each module in turn.
+    """
+    t3, t2, t1 = np.indices((size, size, size))
+    highest = np.where(t3 > 0, 0, np.where(t2 > 0, 1, 2))  # Tier whose coefficients apply
+    last = np.where(t1 > 0, 2, np.where(t2 > 0, 1, 0))  # Tier of the last module added
+    coeffs = np.array([coeffs for _, coeffs in CONSTRUCTION_BONUSES])
+    bases = np.array([base for base, _ in CONSTRUCTION_BONUSES])
+    applied = np.maximum(t3 + t2 + t1 - 1, 0)
+    step = bases[last] * coeffs[highest, np.minimum(applied, coeffs.shape[1] - 1)]
+
+    table = np.zeros((size, size, size))
+    for n in range(1, size):
+        table[n, 0, 0] = table[n - 1, 0, 0] + step[n, 0, 0]
+    for n in range(1, size):
+        table[:, n, 0] = table[:, n - 1, 0] + step[:, n, 0]
+    for n in range(1, size):
+        table[:, :, n] = table[:, :, n - 1] + step[:, :, n]
+
+    return np.minimum(table, 0.50)  # Cap total bonus at 50%
+
+
+def construction_bonuses(t3_counts, t2_counts, t1_counts) -> np.ndarray:
+    """
+    Construction bonus of arrays of T3, T2 and T1 module counts, by table lookup.
+    """
+    counts = np.broadcast_arrays(*(np.asarray(n, dtype=int) for n in (t3_counts, t2_counts, t1_counts)))
+    table = construction_bonus_table()
+    if any(((n < 0) | (n >= len(table))).any() for n in counts):
+        raise ValueError(f"Construction module counts must be between 0 and {len(table) - 1}")
+    return table[tuple(counts)]
+
 
-    return min(total_bonus, 0.50)  # Cap total bonus at 50%
+def construction_bonus(t3_count: int, t2_count: int, t1_count: int) -> float:
+    return float(construction_bonuses(t3_count, t2_count, t1_count))
 
 
 def base_habitat_stats(module: c.ModuleData, hab_stats: c.HabStats, solar_body: str) -> c.ModuleData:
@@ -131,12 +183,12 @@ def base_habitat_stats(module: c.ModuleData, hab_stats: c.HabStats, solar_body:
     return hab_stats
 
 
-def update_habitat_stats(hab_stats: c.HabStats, hab_modules: list, all_modules: c.ModuleData):
-    hab_state = st.session_state.habitat
-
+def update_habitat_stats(hab_stats: c.HabStats, hab_modules: list, all_modules: c.ModuleData, hab_state: dict):
+    """
+    Apply the habitat wide modifiers (admin, farms, site mining) to the summed module stats.
+    """
     # Add Administration Module bonuses
-    admin_bonus = {"AdministrationComplex": 1.1, "AdministrationTower": 1.05}
-    admin_modifier = max((admin_bonus[m] for m in hab_modules if m in admin_bonus), default=1)
+    admin_modifier = max((c.admin_bonuses[m] for m in hab_modules if m in c.admin_bonuses), default=1)
     admin_incomes = ["incomeMoney_month", "incomeInfluence_month", "incomeOps_month", "incomeResearch_month"]
     for i in admin_incomes:
         hab_stats[i] = hab_stats[i] * admin_modifier
@@ -161,18 +213,20 @@ def update_habitat_stats(hab_stats: c.HabStats, hab_modules: list, all_modules:
     return hab_stats
 
 
-def display_habitat_stats(habitat_data: c.ModuleData, all_modules: c.ModuleData) -> None:
+@span()
+def display_habitat_stats(habitat_data: c.ModuleData, all_modules: c.ModuleData,
+                          accumulator: StatsAccumulator | None = None) -> None:
     """
     Display the habitat stats in the Streamlit app.
+    With an accumulator, the stats are updated from the edited cells only.
     """
-    module_list = [m[1] for m in habitat_data["cells"].values() if m[1]]
-
-    hab_stats = get_default_stats()
-    solar_body = habitat_data["body"]
-    for module in module_list:
-        module_data = all_modules[module]
-        base_habitat_stats(module_data, hab_stats, solar_body)
-    update_habitat_stats(hab_stats, module_list, all_modules)
+    if accumulator is not None:
+        accumulator.sync(habitat_data)
+        hab_stats = accumulator.habitat_stats(habitat_data.get("body", "Earth (LEO)"), habitat_data.get("site", {}))
+        module_count = accumulator.count
+    else:
+        hab_stats = compute_habitat_stats(habitat_data, all_modules)
+        module_count = [m[-1] for m in habitat_cells(habitat_data, all_modules.names).values() if m[-1]].count
 
     if habitat_data["type"] == "base":
         site_res = format_resource_string(habitat_data.get("site", {}))
@@ -236,9 +290,9 @@ def display_habitat_stats(habitat_data: c.ModuleData, all_modules: c.ModuleData)
                     col_stats_index = (col_stats_index + 1) % 4
 
                 case "CanFoundHabs":
-                    t3_count = module_list.count("NanofacturingComplex")
-                    t2_count = module_list.count("Nanofactory")
-                    t1_count = module_list.count("ConstructionModule")
+                    t3_count = module_count("NanofacturingComplex")
+                    t2_count = module_count("Nanofactory")
+                    t1_count = module_count("ConstructionModule")
                     bonus = construction_bonus(t3_count, t2_count, t1_count)
 
                     with cols_stats[col_stats_index]:
@@ -286,3 +340,96 @@ def display_habitat_stats(habitat_data: c.ModuleData, all_modules: c.ModuleData)
                             "allowsResupply", "CanFoundHabs", "allowsShipConstruction") else f"{icon}"
                         st.write(display, unsafe_allow_html=True)
                     col_stats_index = (col_stats_index + 1) % 4
+
+
+@span()
+def body_sweep_table(habitat_data: c.ModuleData, all_modules: c.ModuleData,
+                     accumulator: StatsAccumulator | None = None) -> dict[str, list]:
+    """
+    Solar body dependent stats of a habitat at every body of solar_modifiers, computed in one pass.
+    Returns the table columns: power, control points and the LEO bonuses the habitat grants.
+    """
+    site = habitat_data.get("site", {})
+    if accumulator is not None:
+        accumulator.sync(habitat_data)
+        engine, totals = accumulator.engine, accumulator.sweep(site)
+    else:
+        engine = get_engine(all_modules)
+        cells = habitat_cells(habitat_data, engine.names)
+        modules = [m[-1] for m in cells.values() if m[-1]]
+        mining_module = cells.get("0_3", [None])[-1]
+        totals = engine.sweep(engine.count_vector(modules), site, engine.mining_modifier_of(mining_module))
+
+    col = engine.column_index
+    table = {
+        "System Body": list(c.solar_modifiers),
+        "Power": [format_number(v) for v in totals[:, col["power"]].tolist()],
+        "Control Points": [format_number(v) for v in totals[:, col["controlPointCapacity"]].tolist()],
+    }
+    for i in engine.group_columns("leoBonuses"):
+        if totals[:, i].any():
+            category = engine.columns[i].split(".", 1)[1]
+            table[f"LEO {category.title()}"] = [format_number(v) for v in totals[:, i].tolist()]
+    return table
+
+
+def display_body_sweep(habitat_data: c.ModuleData, all_modules: c.ModuleData,
+                       accumulator: StatsAccumulator | None = None) -> None:
+    """
+    Display the habitat solar body comparison table in the Streamlit app.
+    """
+    st.dataframe(body_sweep_table(habitat_data, all_modules, accumulator), hide_index=True,
+                 use_container_width=True)
+
+
+# Stats summarizing the effect of a module on the habitat: stat columns summed with their weights,
+# and whether higher is better when ranking modules. Upkeep and build cost count the resources spent
+GAIN_STATS = {
+    "Power": ({"power": 1}, True),
+    "Money": ({"incomeMoney_month": 1, "supportMaterials_month.money": 1}, True),
+    "Influence": ({"incomeInfluence_month": 1}, True),
+    "Ops": ({"incomeOps_month": 1}, True),
+    "Research": ({"incomeResearch_month": 1}, True),
+    "Projects": ({"incomeProjects": 1}, True),
+    "Mission Control": ({"missionControl": 1}, True),
+    "Antimatter": ({"incomeAntimatter_month": 1}, True),
+    "Combat Value": ({"spaceCombatValue": 1}, True),
+    "Upkeep": ({f"supportMaterials_month.{r}": -1 for r in RESOURCES}, False),
+    "Build Cost": ({f"weightedBuildMaterials.{r}": 1 for r in RESOURCES}, False),
+}
+
+
+@span()
+def module_gains(habitat_data: c.ModuleData, accumulator: StatsAccumulator, label: str,
+                 candidates: list[str]) -> dict[str, dict[str, float]]:
+    """
+    Marginal effect of placing each candidate module in a cell, on every GAIN_STATS stat,
+    all candidates being scored in one batched evaluation of the habitat.
+    """
+    accumulator.sync(habitat_data)
+    engine = accumulator.engine
+    deltas = accumulator.marginal_gains(label, candidates, habitat_data.get("body", "Earth (LEO)"),
+                                        habitat_data.get("site", {}))
+
+    weights = np.zeros((len(engine.columns), len(GAIN_STATS)))
+    for j, (columns, _) in enumerate(GAIN_STATS.values()):
+        for k, w in columns.items():
+            if k in engine.column_index:
+                weights[engine.column_index[k], j] = w
+    gains = np.round(deltas @ weights, 6)  # Drop the float residue of unchanged stats
+    return {name: dict(zip(GAIN_STATS, row)) for name, row in zip(candidates, gains.tolist())}
+
+
+def rank_modules(gains: dict[str, dict[str, float]], stat: str) -> list[str]:
+    """
+    Candidate modules ordered from the best to the worst change of a GAIN_STATS stat.
+    """
+    higher_is_better = GAIN_STATS[stat][1]
+    return sorted(gains, key=lambda name: -gains[name][stat] if higher_is_better else gains[name][stat])
+
+
+def format_gains(gains: dict[str, float]) -> str:
+    """
+    Non-zero stat changes of a module, e.g. "+42 Power, -4 Research".
+    """
+    return ", ".join(f"{'+' if v > 0 else ''}{format_number(v)} {k}" for k, v in gains.items() if v)
@@ -0,0 +1,75 @@
+import zlib
+import numpy as np
+
+from modules.constants import ModuleData, pretty_stats
+
+RESOURCES = ("water", "volatiles", "metals", "nobleMetals", "fissiles")
+STAT_FIELDS = ("crew", "power", "baseMass_tons", "buildTime_Days", "incomeMoney_month", "incomeInfluence_month",
+               "incomeOps_month", "incomeResearch_month", "incomeProjects", "missionControl", "incomeAntimatter_month",
+               "spaceCombatValue", "constructionTimeModifier", "miningModifier", "controlPointCapacity")
+STAT_INDEX = {k: i for i, k in enumerate(STAT_FIELDS)}
+
+
+class ModuleCatalog(dict[str, ModuleData]):
+    """
+    Module data by dataName, with lookups and filter indexes precomputed once.
+    Each index is a boolean mask over the modules in template order,
+    so filter queries are mask intersections.
+    The numeric stats are stacked into one module-by-field matrix in the same order.
+    """
+
+    def __init__(self, modules: dict[str, ModuleData]):
+        super().__init__(modules)
+        self.names: list[str] = list(modules)
+        self.position: dict[str, int] = {name: i for i, name in enumerate(self.names)}
+        # Identifies the module positions, for habitat codes storing modules by position
+        self.fingerprint: int = zlib.crc32("\n".join(self.names).encode()) & 0xFFFF
+        self.tiers: dict[str, int] = {name: m["tier"] for name, m in modules.items()}
+        self.friendly_names: dict[str, str] = {name: m["friendlyName"] for name, m in modules.items()}
+        self.tooltips: dict[str, str] = {}  # Filled lazily by habitat_module.module_tooltip
+
+        self.stats = np.array([[m.get(k, 0) for k in STAT_FIELDS] for m in modules.values()],
+                              dtype=float).reshape(len(modules), len(STAT_FIELDS))
+        self.stats.flags.writeable = False
+        hab_types = np.array([m["habType"] for m in modules.values()], dtype=str)
+        tiers = np.array([m["tier"] for m in modules.values()], dtype=int)
+        self.by_hab_type: dict[str, np.ndarray] = {
+            hab_type: hab_types == hab_type for hab_type in dict.fromkeys(hab_types.tolist())}
+        self.by_tier: dict[int, np.ndarray] = {tier: tiers == tier for tier in np.unique(tiers).tolist()}
+        self.core = np.array([m.get("coreModule", False) for m in modules.values()], dtype=bool)
+        self.mining = np.array([m.get("mine", False) for m in modules.values()], dtype=bool)
+        self.one_per_hab = np.array([m.get("onePerHab", False) for m in modules.values()], dtype=bool)
+        self.income: dict[str, np.ndarray] = {
+            stat: self.stats[:, STAT_INDEX[stat]] > 0 for stat in dict.fromkeys(pretty_stats.values())}
+
+    def stat_column(self, key: str) -> np.ndarray:
+        """
+        Values of a numeric stat for every module, in template order.
+        """
+        return self.stats[:, STAT_INDEX[key]]
+
+    def _any_of(self, index: dict, keys) -> np.ndarray:
+        mask = np.zeros(len(self.names), dtype=bool)
+        for k in keys:
+            if k in index:
+                mask |= index[k]
+        return mask
+
+    def select(self, hab_types=None, tiers=None, core: bool | None = None,
+               incomes=(), mining: bool | None = None) -> list[str]:
+        """
+        Names of the modules matching every given filter, in template order.
+        incomes keeps modules with a positive value for any of the given stats.
+        """
+        mask = np.ones(len(self.names), dtype=bool)
+        if hab_types is not None:
+            mask &= self._any_of(self.by_hab_type, hab_types)
+        if tiers is not None:
+            mask &= self._any_of(self.by_tier, tiers)
+        if core is not None:
+            mask &= self.core if core else ~self.core
+        if incomes:
+            mask &= self._any_of(self.income, incomes)
+        if mining is not None:
+            mask &= self.mining if mining else ~self.mining
+        return [self.names[i] for i in np.flatnonzero(mask)]
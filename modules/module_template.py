@@ -0,0 +1,36 @@
+import json
+
+from modules.constants import ModuleData
+
+TEMPLATE_PATH = "data/TIHabModuleTemplate.json"
+
+EXCLUDED_MODULE_TYPES = ("alienModule", "destroyed", "automated")
+
+# Module fields used by the planner, everything else is dropped when loading
+STRING_FIELDS = ("dataName", "friendlyName", "habType")
+FLAG_FIELDS = ("coreModule", "onePerHab", "allowsShipConstruction", "allowsResupply", "mine", "noBuild")
+NUMBER_FIELDS = ("tier", "crew", "power", "baseMass_tons", "buildTime_Days", "incomeMoney_month",
+                 "incomeInfluence_month", "incomeOps_month", "incomeResearch_month", "incomeProjects",
+                 "missionControl", "incomeAntimatter_month", "spaceCombatValue", "constructionTimeModifier",
+                 "miningModifier", "controlPointCapacity")
+DICT_FIELDS = ("supportMaterials_month", "weightedBuildMaterials")
+LIST_FIELDS = ("specialRules", "techBonuses")
+USED_FIELDS = frozenset(STRING_FIELDS + FLAG_FIELDS + NUMBER_FIELDS + DICT_FIELDS + LIST_FIELDS)
+
+
+def read_template(path: str = TEMPLATE_PATH) -> dict[str, ModuleData]:
+    """
+    Parse the module template JSON, without the alien, destroyed and automated modules.
+    """
+    with open(path, "r") as file:
+        return {d["dataName"]: d for d in json.load(file)
+                if not any(d.get(k, False) for k in EXCLUDED_MODULE_TYPES)}
+
+
+def load_template(path: str = TEMPLATE_PATH) -> dict[str, ModuleData]:
+    """
+    Load the module data, keeping only the fields the planner uses.
+    The icon, model and destruction asset paths make up most of the template, and are dropped.
+    """
+    return {name: {k: v for k, v in module.items() if k in USED_FIELDS}
+            for name, module in read_template(path).items()}
@@ -0,0 +1,151 @@
+import numpy as np
+
+from modules import constants as c
+from modules.habitat_slots import CORE_CELL, MINING_CELL, MODULE_CELL, slot_table
+from modules.module_catalog import ModuleCatalog
+from modules.stats_engine import get_engine
+
+# Optimization objectives: weights of the stat columns to maximize, and minimum stat values to satisfy
+objectives = {
+    "research": {
+        "maximize": {"incomeResearch_month": 1},
+        "minimums": {"power": 0, "supportMaterials_month.water": 0, "supportMaterials_month.volatiles": 0},
+    },
+    "money": {
+        "maximize": {"incomeMoney_month": 1, "supportMaterials_month.money": 1},
+        "minimums": {"power": 0, "supportMaterials_month.water": 0, "supportMaterials_month.volatiles": 0},
+    },
+    "build_cost": {
+        "maximize": {f"weightedBuildMaterials.{r}": -1 for r in ("water", "volatiles", "metals", "nobleMetals",
+                                                                 "fissiles")},
+        "minimums": {"power": 0, "incomeResearch_month": 50},
+    },
+}
+
+
+def objective_vectors(columns: dict[str, int], objective: dict) -> tuple[np.ndarray, list[int], np.ndarray]:
+    """
+    Convert an objective into a column weights vector, and minimum constraints columns and values.
+    """
+    weights = np.zeros(len(columns))
+    for k, w in objective["maximize"].items():
+        weights[columns[k]] = w
+    minimums = objective.get("minimums", {})
+    return weights, [columns[k] for k in minimums], np.array(list(minimums.values()), dtype=float)
+
+
+def optimize_layout(all_modules: ModuleCatalog, core: str, solar_body: str, site: dict | None = None,
+                    objective: dict | str = "research", top_n: int = 5, beam_width: int = 128,
+                    penalty: float = 1000.0) -> list[dict]:
+    """
+    Beam search the module assignments of a habitat core for the best layouts.
+    Placement order doesn't change the stats, so layouts with the same module counts are merged;
+    constraint violations are penalized while searching, and feasible layouts rank first.
+    Returns up to top_n habitat dictionaries, in the planner's save format.
+    """
+    engine = get_engine(all_modules)
+    objective = objectives[objective] if isinstance(objective, str) else objective
+    weights, min_cols, min_values = objective_vectors(engine.column_index, objective)
+
+    hab_type, tier = all_modules[core]["habType"], all_modules.tiers[core]
+    table = slot_table(hab_type, tier)
+    cells = list(zip(table.labels, table.cell_types.tolist()))
+    mining_slots = [label for label, cell in cells if cell == MINING_CELL]
+    module_slots = [label for label, cell in cells if cell == MODULE_CELL]
+
+    def candidates(mining: bool | None) -> np.ndarray:
+        names = all_modules.select(hab_types=(hab_type, "Any"), tiers=range(1, tier + 1), core=False, mining=mining)
+        names = [n for n in names if solar_body == "Earth (LEO)"
+                 or "EarthLEOOnly" not in all_modules[n].get("specialRules", [])]
+        return np.array([engine.index[n] for n in names] + [-1])  # -1 leaves the cell empty
+
+    one_per_hab = all_modules.one_per_hab[[all_modules.position[n] for n in engine.names]]
+
+    layout_hash = np.random.default_rng(0).random(len(engine.names) + 1)
+
+    def expand(counts, picks, mining_modifier, choices):
+        """
+        Every state extended by every choice, minus the invalid combinations.
+        """
+        steps = np.eye(len(engine.names) + 1)[choices][:, :-1]  # One-hot rows, empty choice is all zeros
+        new_counts = (counts[:, None, :] + steps[None, :, :]).reshape(-1, counts.shape[1])
+        state_idx = np.repeat(np.arange(len(counts)), len(choices))
+        choice_pos = np.tile(np.arange(len(choices)), len(counts))
+
+        valid = ~(new_counts[:, one_per_hab] > 1).any(axis=1)
+        state_idx, choice_pos = state_idx[valid], choice_pos[valid]
+        return new_counts[valid], np.column_stack([picks[state_idx], choice_pos]), mining_modifier[state_idx]
+
+    def prune(counts, picks, mining_modifier, keep):
+        """
+        Keep the best scoring states, once per distinct module counts and mining modifier.
+        """
+        totals = engine.evaluate(counts, solar_body, site, mining_modifier)
+        violation = np.maximum(0, min_values - totals[:, min_cols]).sum(axis=1)
+        scores = totals @ weights - penalty * violation
+
+        order = np.argsort(-scores, kind="stable")
+        keys = np.column_stack([counts, mining_modifier]) @ layout_hash
+        _, first = np.unique(keys[order], return_index=True)
+        best = order[np.sort(first)][:keep]
+        return counts[best], picks[best], mining_modifier[best], violation[best], scores[best]
+
+    counts = engine.count_vector([core])[None, :]
+    picks = np.zeros((1, 0), dtype=int)
+    mining_modifier = np.zeros(1)
+
+    mining_choices = candidates(mining=True)
+    for _ in mining_slots:
+        counts, picks, mining_modifier = expand(counts, picks, mining_modifier, mining_choices)
+        mining_modifier = np.where(mining_choices[picks[:, -1]] >= 0,
+                                   engine.mining_modifier[mining_choices[picks[:, -1]]], 0)
+
+    module_choices = candidates(mining=None)
+    for _ in module_slots:
+        counts, picks, mining_modifier = expand(counts, picks, mining_modifier, module_choices)
+        counts, picks, mining_modifier, _, _ = prune(counts, picks, mining_modifier, beam_width)
+
+    counts, picks, mining_modifier, violation, scores = prune(counts, picks, mining_modifier, len(counts))
+    ranking = np.lexsort((-scores, violation > 0))[:top_n]
+
+    layouts = []
+    for rank, i in enumerate(ranking, start=1):
+        chosen = [mining_choices[p] for p in picks[i, :len(mining_slots)]]
+        chosen += [module_choices[p] for p in picks[i, len(mining_slots):]]
+        modules = dict(zip(mining_slots + module_slots, (engine.names[m] if m >= 0 else None for m in chosen)))
+
+        habitat = {
+            "cells": {label: [cell, core if cell == CORE_CELL else modules[label]] for label, cell in cells},
+            "core": core,
+            "tier": tier,
+            "type": hab_type.lower(),
+            "body": solar_body,
+            "name": f"Optimized {all_modules.friendly_names[core]} #{rank}",
+        }
+        if hab_type == "Base":
+            habitat["site"] = dict(site or {})
+        layouts.append(habitat)
+
+    return layouts
+
+
+if __name__ == "__main__":
+    import json
+    import argparse
+    from modules.utilities import load_module_data
+
+    parser = argparse.ArgumentParser(description="Search the best module layouts of a habitat core.")
+    parser.add_argument("core", help="core module dataName, e.g. RingCore")
+    parser.add_argument("--body", default="Earth (LEO)", choices=list(c.solar_modifiers))
+    parser.add_argument("--objective", default="research", choices=list(objectives))
+    parser.add_argument("--site", default="{}", help='base site resources as JSON, e.g. {"water": 2}')
+    parser.add_argument("--top", type=int, default=5)
+    parser.add_argument("--beam", type=int, default=128)
+    args = parser.parse_args()
+
+    results = optimize_layout(load_module_data(), args.core, args.body, json.loads(args.site),
+                              args.objective, top_n=args.top, beam_width=args.beam)
+    for rank, habitat in enumerate(results, start=1):
+        with open(f"habitat_{args.core}_{args.objective}_{rank}.json", "w") as file:
+            file.write(json.dumps(habitat, separators=(',', ':')))
+        print(f"habitat_{args.core}_{args.objective}_{rank}.json")
@@ -0,0 +1,261 @@
+import json
+import numpy as np
+
+from modules import constants as c
+from modules.habitat_slots import BODIES, EMPTY, habitat_table, load_habitat, slot_table
+from modules.module_catalog import ModuleCatalog
+from modules.stats_engine import RESOURCES, get_engine
+
+PORTFOLIO_FORMAT = "ti_planner_portfolio"
+PORTFOLIO_VERSION = 1
+
+BODY_MODIFIERS = np.array([c.solar_modifiers[b] for b in BODIES])
+LEO_BODY = BODIES.index("Earth (LEO)")
+MAX_SLOTS = max(len(slot_table(hab_type, tier).labels)
+                for hab_type, layouts in c.habitat_layouts.items() for tier in layouts)
+
+# Portfolio table columns: stat columns summed with their weights, as in the habitat stats display.
+# Upkeep counts the resources spent, the negated support materials
+TABLE_STATS = {
+    "Power": {"power": 1},
+    "Money": {"incomeMoney_month": 1, "supportMaterials_month.money": 1},
+    "Influence": {"incomeInfluence_month": 1},
+    "Ops": {"incomeOps_month": 1},
+    "Research": {"incomeResearch_month": 1},
+    "Mission Control": {"missionControl": 1},
+    "Control Points": {"controlPointCapacity": 1},
+    **{f"{r.title()} Upkeep": {f"supportMaterials_month.{r}": -1} for r in RESOURCES},
+}
+
+
+class Portfolio:
+    """
+    The habitats of a campaign in a columnar store: one array entry per habitat in every column,
+    the cells as a matrix of slot arrays padded to MAX_SLOTS, and the evaluated stat columns of each habitat.
+    All habitats are evaluated in one batched pass; the portfolio totals are updated by difference
+    when a single habitat is added, edited or removed.
+    """
+
+    def __init__(self, all_modules: ModuleCatalog):
+        self.all_modules = all_modules
+        self.engine = get_engine(all_modules)
+        self.names: list[str] = []
+        self.cores: list[str] = []
+        self.hab_types = np.zeros(0, dtype="U7")
+        self.tiers = np.zeros(0, dtype=np.int8)
+        self.bodies = np.zeros(0, dtype=np.int8)  # Index in BODIES
+        self.sites = np.zeros((0, len(RESOURCES)))
+        self.slots = np.full((0, MAX_SLOTS), EMPTY, dtype=np.int16)
+        self.mining_slots = np.zeros(0, dtype=np.int8)  # EMPTY without a mining cell
+        self.totals = np.zeros((0, len(self.engine.columns)))
+        self.total = np.zeros(len(self.engine.columns))
+
+        # Site resources to support material columns
+        self._site_map = np.array([self.engine.site_vector({r: 1}) for r in RESOURCES])
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def _evaluate(self, rows) -> np.ndarray:
+        """
+        Final stat columns of the given habitats, evaluated as one batch.
+        """
+        engine = self.engine
+        slots = self.slots[rows]
+        placed = slots != EMPTY
+        counts = np.zeros((len(slots), len(engine.names)))
+        np.add.at(counts, (np.nonzero(placed)[0], slots[placed]), 1)
+
+        mining_slots = self.mining_slots[rows]
+        mining_ids = np.where(mining_slots != EMPTY, slots[np.arange(len(slots)), mining_slots], EMPTY)
+        mining_modifier = np.where(mining_ids != EMPTY, engine.mining_modifier[mining_ids], 0)
+
+        bodies = self.bodies[rows]
+        return engine.apply_rules_at(counts @ engine.matrix, engine.admin_counts(counts), BODY_MODIFIERS[bodies],
+                                     bodies == LEO_BODY, self.site_vectors(rows), mining_modifier)
+
+    def site_vectors(self, rows=slice(None)) -> np.ndarray:
+        """
+        Site resources of the given habitats as stats engine site_vector rows.
+        """
+        return self.sites[rows] @ self._site_map
+
+    def evaluate_all(self) -> None:
+        """
+        Recompute the stats of every habitat and the portfolio totals.
+        """
+        self.totals = self._evaluate(slice(None))
+        self.total = self.totals.sum(axis=0)
+
+    def _columns(self, habitat: dict) -> tuple:
+        table = habitat_table(habitat)
+        slots = np.full(MAX_SLOTS, EMPTY, dtype=np.int16)
+        slots[:len(table.labels)] = habitat["slots"]
+        site = [(habitat.get("site") or {}).get(r, 0) for r in RESOURCES]
+        return (habitat.get("name", ""), habitat["core"], habitat["type"].lower(), habitat["tier"],
+                BODIES.index(habitat.get("body", "Earth (LEO)")), site, slots, table.mining_slot)
+
+    def add(self, habitat: dict) -> int:
+        """
+        Append a planner habitat, and return its index.
+        """
+        name, core, hab_type, tier, body, site, slots, mining_slot = self._columns(habitat)
+        self.names.append(name)
+        self.cores.append(core)
+        self.hab_types = np.append(self.hab_types, hab_type)
+        self.tiers = np.append(self.tiers, np.int8(tier))
+        self.bodies = np.append(self.bodies, np.int8(body))
+        self.sites = np.vstack([self.sites, site])
+        self.slots = np.vstack([self.slots, slots])
+        self.mining_slots = np.append(self.mining_slots, np.int8(mining_slot))
+
+        index = len(self.names) - 1
+        self.totals = np.vstack([self.totals, self._evaluate([index])])
+        self.total += self.totals[index]
+        return index
+
+    def update(self, index: int, habitat: dict) -> None:
+        """
+        Replace a habitat, re-evaluating it alone and applying the difference to the totals.
+        """
+        name, core, hab_type, tier, body, site, slots, mining_slot = self._columns(habitat)
+        self.names[index], self.cores[index] = name, core
+        changed = not (np.array_equal(self.slots[index], slots) and self.bodies[index] == body
+                       and np.array_equal(self.sites[index], site))
+        self.hab_types[index], self.tiers[index], self.bodies[index] = hab_type, tier, body
+        self.sites[index], self.slots[index], self.mining_slots[index] = site, slots, mining_slot
+
+        if changed:
+            totals = self._evaluate([index])[0]
+            self.total += totals - self.totals[index]
+            self.totals[index] = totals
+
+    def remove(self, index: int) -> None:
+        self.total -= self.totals[index]
+        del self.names[index], self.cores[index]
+        for column in ("hab_types", "tiers", "bodies", "sites", "slots", "mining_slots", "totals"):
+            setattr(self, column, np.delete(getattr(self, column), index, axis=0))
+
+    def habitat(self, index: int) -> dict:
+        """
+        A habitat of the portfolio, in the planner's format.
+        """
+        table = slot_table(str(self.hab_types[index]), int(self.tiers[index]))
+        habitat = {"slots": self.slots[index, :len(table.labels)].copy(), "core": self.cores[index],
+                   "tier": int(self.tiers[index]), "type": str(self.hab_types[index]),
+                   "body": BODIES[self.bodies[index]], "name": self.names[index]}
+        if habitat["type"] == "base":
+            habitat["site"] = dict(zip(RESOURCES, self.sites[index].tolist()))
+        return habitat
+
+    def column(self, weights: dict[str, float], totals: np.ndarray | None = None) -> np.ndarray:
+        """
+        Weighted sum of stat columns, per habitat, or of the given totals.
+        """
+        vector = np.zeros(len(self.engine.columns))
+        for k, w in weights.items():
+            vector[self.engine.column_index[k]] = w
+        return (self.totals if totals is None else totals) @ vector
+
+    def table(self) -> dict[str, list]:
+        """
+        Per habitat columns of the portfolio table: identity, then the TABLE_STATS stats.
+        """
+        table = {
+            "Name": list(self.names),
+            "Type": [t.title() for t in self.hab_types.tolist()],
+            "Tier": self.tiers.tolist(),
+            "Core": [self.all_modules.friendly_names.get(core, core) for core in self.cores],
+            "System Body": [BODIES[b] for b in self.bodies.tolist()],
+        }
+        table.update({name: np.round(self.column(weights), 2).tolist() for name, weights in TABLE_STATS.items()})
+        return table
+
+    def stats(self) -> c.HabStats:
+        """
+        Portfolio totals, in the HabStats dictionary layout.
+        """
+        return self.engine.to_stats(self.total, (self.totals != 0).any(axis=0))
+
+    def to_json(self) -> str:
+        """
+        Serialize the portfolio columns into a single JSON document.
+        Module ids are stored as indices into the list of the module names used.
+        """
+        placed = self.slots != EMPTY
+        used = np.unique(self.slots[placed])
+        file_ids = np.where(placed, np.searchsorted(used, self.slots), EMPTY)
+        lengths = [len(slot_table(t, tier).labels) for t, tier in zip(self.hab_types.tolist(), self.tiers.tolist())]
+        return json.dumps({
+            "format": PORTFOLIO_FORMAT,
+            "version": PORTFOLIO_VERSION,
+            "modules": [self.all_modules.names[i] for i in used.tolist()],
+            "habitats": {
+                "name": self.names,
+                "type": self.hab_types.tolist(),
+                "tier": self.tiers.tolist(),
+                "core": self.cores,
+                "body": [BODIES[b] for b in self.bodies.tolist()],
+                "site": self.sites.tolist(),
+                "slots": [row[:n] for row, n in zip(file_ids.tolist(), lengths)],
+            },
+        }, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, text: str, all_modules: ModuleCatalog) -> "Portfolio":
+        """
+        Load a portfolio file, or a list of habitats in the single habitat JSON save format.
+        Modules missing from the module data are left empty; malformed module ids raise ValueError.
+        """
+        data = json.loads(text)
+        if isinstance(data, list):
+            return cls.from_habitats([load_habitat(habitat, all_modules) for habitat in data], all_modules)
+        if data.get("format") != PORTFOLIO_FORMAT:
+            return cls.from_habitats([load_habitat(data, all_modules)], all_modules)
+        if data.get("version", 0) > PORTFOLIO_VERSION:
+            raise ValueError(f"Portfolio format version {data['version']} is newer than this planner's")
+
+        portfolio = cls(all_modules)
+        columns = data["habitats"]
+        # The last entry maps the EMPTY file id
+        lookup = np.array([all_modules.position.get(name, EMPTY) for name in data["modules"]] + [EMPTY],
+                          dtype=np.int16)
+        slots = np.full((len(columns["name"]), MAX_SLOTS), EMPTY, dtype=np.int16)
+        for row, ids, hab_type, tier in zip(slots, columns["slots"], columns["type"], columns["tier"]):
+            ids = np.asarray(ids, dtype=int)
+            cells = len(slot_table(hab_type, tier).labels)
+            if len(ids) != cells:
+                raise ValueError(f"Portfolio habitat has {len(ids)} cells, a tier {tier} {hab_type} has {cells}")
+            if ((ids < EMPTY) | (ids >= len(data["modules"]))).any():
+                raise ValueError(f"Portfolio module ids must be between {EMPTY} and {len(data['modules']) - 1}")
+            row[:len(ids)] = lookup[ids]
+
+        portfolio.names, portfolio.cores = list(columns["name"]), list(columns["core"])
+        portfolio.hab_types = np.array(columns["type"], dtype="U7")
+        portfolio.tiers = np.array(columns["tier"], dtype=np.int8)
+        portfolio.bodies = np.array([BODIES.index(b) for b in columns["body"]], dtype=np.int8)
+        portfolio.sites = np.array(columns["site"], dtype=float).reshape(-1, len(RESOURCES))
+        portfolio.slots = slots
+        portfolio.mining_slots = np.array([slot_table(t, tier).mining_slot
+                                           for t, tier in zip(columns["type"], columns["tier"])], dtype=np.int8)
+        portfolio.evaluate_all()
+        return portfolio
+
+    @classmethod
+    def from_habitats(cls, habitats: list[dict], all_modules: ModuleCatalog) -> "Portfolio":
+        """
+        Build a portfolio of planner habitats, evaluated in one pass.
+        """
+        portfolio = cls(all_modules)
+        if habitats:
+            names, cores, hab_types, tiers, bodies, sites, slots, mining_slots \
+                = zip(*(portfolio._columns(habitat) for habitat in habitats))
+            portfolio.names, portfolio.cores = list(names), list(cores)
+            portfolio.hab_types = np.array(hab_types, dtype="U7")
+            portfolio.tiers = np.array(tiers, dtype=np.int8)
+            portfolio.bodies = np.array(bodies, dtype=np.int8)
+            portfolio.sites = np.array(sites, dtype=float)
+            portfolio.slots = np.array(slots, dtype=np.int16)
+            portfolio.mining_slots = np.array(mining_slots, dtype=np.int8)
+        portfolio.evaluate_all()
+        return portfolio
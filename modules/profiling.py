@@ -0,0 +1,140 @@
+import os
+import json
+import time
+import logging
+import threading
+import streamlit as st
+
+from collections import defaultdict
+from functools import wraps
+
+# Profiling is requested with this environment variable, or the "?profile=1" query parameter
+PROFILE_ENV = "TI_PLANNER_PROFILE"
+
+logger = logging.getLogger(__name__)
+
+
+class _ThreadProfile(threading.local):
+    profile = None
+
+
+# Streamlit runs each session's script in its own thread, so every rerun records into its own profile
+_local = _ThreadProfile()
+
+
+class RerunProfile:
+    """
+    Stage timings, cache lookups and payload sizes collected during one script rerun.
+    """
+
+    def __init__(self, page: str = ""):
+        self.page = page
+        self.timestamp = time.time()
+        self.start = time.perf_counter()
+        self.duration: float | None = None
+        self.spans: dict[str, list[float]] = defaultdict(list)
+        self.cache: dict[str, list[int]] = defaultdict(lambda: [0, 0])  # Hits, misses
+        self.payload: dict[str, int] = defaultdict(int)
+
+    def stage_summary(self) -> list[dict]:
+        """
+        Per stage call count and latencies in milliseconds, slowest stage first.
+        Nested stages are included in their callers' time.
+        """
+        rows = [{"stage": name, "calls": len(times), "total_ms": sum(times) * 1e3,
+                 "mean_ms": sum(times) / len(times) * 1e3, "max_ms": max(times) * 1e3}
+                for name, times in self.spans.items()]
+        return sorted(rows, key=lambda row: -row["total_ms"])
+
+    def cache_summary(self) -> list[dict]:
+        return [{"cache": name, "hits": hits, "misses": misses, "hit_rate": hits / (hits + misses)}
+                for name, (hits, misses) in self.cache.items() if hits + misses]
+
+    def records(self) -> list[dict]:
+        """
+        Structured records of the rerun, one per stage, cache and payload, for log export.
+        """
+        base = {"page": self.page, "timestamp": self.timestamp, "rerun_ms": (self.duration or 0) * 1e3}
+        return [dict(base, kind="stage", **row) for row in self.stage_summary()] \
+            + [dict(base, kind="cache", **row) for row in self.cache_summary()] \
+            + [dict(base, kind="payload", source=name, bytes=size) for name, size in self.payload.items()]
+
+    def to_json_lines(self) -> str:
+        return "\n".join(json.dumps(record) for record in self.records())
+
+
+def requested() -> bool:
+    return bool(os.environ.get(PROFILE_ENV)) or st.query_params.get("profile") == "1"
+
+
+def begin_rerun(enabled: bool, page: str = "") -> RerunProfile | None:
+    """
+    Start recording a new rerun of the current session, or stop recording when not enabled.
+    """
+    _local.profile = RerunProfile(page) if enabled else None
+    return _local.profile
+
+
+def end_rerun() -> RerunProfile | None:
+    """
+    Stop recording, and log the records of the finished rerun at debug level.
+    """
+    profile = _local.profile
+    _local.profile = None
+    if profile is not None:
+        profile.duration = time.perf_counter() - profile.start
+        if logger.isEnabledFor(logging.DEBUG):
+            for record in profile.records():
+                logger.debug(json.dumps(record))
+    return profile
+
+
+def span(name: str | None = None):
+    """
+    Decorator timing every call of a function into the current rerun profile, under name.
+    Without an active profile it costs a thread-local lookup per call.
+    """
+    def decorator(func):
+        label = name or func.__name__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            profile = _local.profile
+            if profile is None:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.spans[label].append(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def cache_lookup(name: str, hit: bool) -> None:
+    profile = _local.profile
+    if profile is not None:
+        profile.cache[name][0 if hit else 1] += 1
+
+
+def payload(name: str, size: int) -> None:
+    profile = _local.profile
+    if profile is not None:
+        profile.payload[name] += size
+
+
+def display_profile(profile: RerunProfile) -> None:
+    """
+    Display the debug panel of a finished rerun: stage latencies, cache hit rates and payload bytes.
+    """
+    with st.expander(label="Profiling", icon=":material/speed:", expanded=True):
+        st.caption(f"Rerun: {(profile.duration or 0) * 1e3:.1f} ms, "
+                   f"payload: {sum(profile.payload.values()) / 1024:.1f} KiB")
+        st.dataframe(profile.stage_summary(), hide_index=True, use_container_width=True,
+                     column_config={k: st.column_config.NumberColumn(format="%.3f")
+                                    for k in ("total_ms", "mean_ms", "max_ms")})
+        st.dataframe(profile.cache_summary(), hide_index=True, use_container_width=True,
+                     column_config={"hit_rate": st.column_config.ProgressColumn(min_value=0, max_value=1)})
+        st.download_button(label="Export profile log", use_container_width=True,
+                           file_name="rerun_profile.jsonl", mime="application/jsonl",
+                           data=profile.to_json_lines())
@@ -0,0 +1,386 @@
+import numpy as np
+
+from functools import lru_cache
+from types import MappingProxyType
+from modules import constants as c
+from modules.habitat_slots import EMPTY, habitat_table, slots_to_cells
+
+# Habitat stats in display order, mirroring get_default_stats()
+STAT_KEYS = ("crew", "baseMass_tons", "power", "incomeMoney_month", "incomeInfluence_month", "incomeOps_month",
+             "incomeResearch_month", "incomeProjects", "missionControl", "controlPointCapacity",
+             "supportMaterials_month", "incomeAntimatter_month", "allowsResupply", "CanFoundHabs",
+             "allowsShipConstruction", "spaceCombatValue", "techBonuses", "leoBonuses", "weightedBuildMaterials")
+DICT_STATS = ("supportMaterials_month", "techBonuses", "leoBonuses", "weightedBuildMaterials")
+RESOURCES = ("water", "volatiles", "metals", "nobleMetals", "fissiles")
+ADMIN_INCOMES = ("incomeMoney_month", "incomeInfluence_month", "incomeOps_month", "incomeResearch_month")
+LINEAR_STATS = tuple(k for k in STAT_KEYS if k not in DICT_STATS and k != "CanFoundHabs")
+
+# Helper columns, folded into the habitat stats by the non-linear rules
+SOLAR_POWER = "_solarPower"
+FARM_SUPPLY = "_farmSupply"
+CAN_FOUND = "_canFound"
+
+
+class StatsEngine:
+    """
+    Compiled habitat stats: every module is a row of a module-by-stat matrix,
+    so a habitat is a count vector and its totals are a single matrix product.
+    Non-linear rules (solar power, LEO only stats, admin multiplier, farm discounts
+    and site mining) are applied afterward using precomputed masks.
+    """
+
+    def __init__(self, all_modules: dict[str, c.ModuleData]):
+        self.names: list[str] = list(all_modules)
+        self.index: dict[str, int] = {name: i for i, name in enumerate(self.names)}
+
+        entries = [self._module_entries(module) for module in all_modules.values()]
+
+        columns = list(LINEAR_STATS)
+        columns += [f"supportMaterials_month.{r}" for r in RESOURCES]
+        columns += [f"weightedBuildMaterials.{r}" for r in RESOURCES]
+        for entry in entries:
+            columns += [k for k in entry if k not in columns and not k.startswith("_")]
+        columns += [SOLAR_POWER, FARM_SUPPLY, CAN_FOUND]
+
+        self.columns: list[str] = columns
+        self.column_index: dict[str, int] = {k: i for i, k in enumerate(columns)}
+
+        self.matrix = np.zeros((len(self.names), len(columns)))
+        self.presence = np.zeros((len(self.names), len(columns)), dtype=bool)
+        integral = np.ones(len(columns), dtype=bool)
+        for row, entry in enumerate(entries):
+            for k, v in entry.items():
+                col = self.column_index[k]
+                self.matrix[row, col] += v
+                self.presence[row, col] = True
+                integral[col] &= isinstance(v, int)
+        self.integral = integral
+
+        self.admin_bonus = np.array([c.admin_bonuses.get(name, 1) for name in self.names], dtype=float)
+        self.mining_modifier = np.array([m.get("miningModifier", 0) for m in all_modules.values()], dtype=float)
+        self.core_mask = np.array([bool(m.get("coreModule", False)) for m in all_modules.values()])
+
+        self._admin_rows = np.flatnonzero(self.admin_bonus != 1)
+        self._admin_cols = [self.column_index[k] for k in ADMIN_INCOMES]
+        self._leo_cols = [self.column_index["controlPointCapacity"]] + self.group_columns("leoBonuses")
+        self._support_cols = self.group_columns("supportMaterials_month")
+        self._support_keys = [self.columns[i].split(".", 1)[1] for i in self._support_cols]
+
+    @staticmethod
+    def _module_entries(module: c.ModuleData) -> dict[str, int | float]:
+        """
+        Flatten a module into its per-instance contribution to each stat column.
+        """
+        entries = {k: module.get(k, 0) for k in LINEAR_STATS}
+        entries["allowsResupply"] = int(entries["allowsResupply"])
+        entries["allowsShipConstruction"] = int(entries["allowsShipConstruction"])
+
+        if "Solar_Power_Variable_Output" in module.get("specialRules", []):
+            entries[SOLAR_POWER] = entries.pop("power")
+
+        for sub_k, sub_v in module.get("supportMaterials_month", {}).items():
+            entries[f"supportMaterials_month.{sub_k}"] = sub_v
+        for sub_k, upkeep in c.pop_upkeep.items():
+            key = f"supportMaterials_month.{sub_k}"
+            entries[key] = entries.get(key, 0) + float(module["crew"]) * upkeep
+
+        for tech in module.get("techBonuses", []):
+            key = f"techBonuses.{tech['category']}"
+            entries[key] = entries.get(key, 0) + tech["bonus"]
+
+        if module["friendlyName"] in c.leo_bonuses:
+            bonus = c.leo_bonuses[module["friendlyName"]]
+            entries[f"leoBonuses.{bonus['category']}"] = bonus["bonus"]
+
+        if not module["coreModule"]:
+            for sub_k, sub_v in module.get("weightedBuildMaterials", {}).items():
+                entries[f"weightedBuildMaterials.{sub_k}"] = sub_v * c.build_multipliers.get(module["dataName"], 0)
+
+        if module["dataName"] in c.farm_supply:
+            entries[FARM_SUPPLY] = c.farm_supply[module["dataName"]]
+        if any(v.startswith("CanFoundTier") for v in module.get("specialRules", [])):
+            entries[CAN_FOUND] = 1
+
+        return entries
+
+    def group_columns(self, group: str) -> list[int]:
+        """
+        Column indices of a dictionary stat, e.g. all "techBonuses.<category>" columns.
+        """
+        return [i for i, k in enumerate(self.columns) if k.startswith(f"{group}.")]
+
+    def count_vector(self, modules) -> np.ndarray:
+        """
+        Convert a list of module dataNames into a module count vector.
+        """
+        ids = [self.index[m] for m in modules if m]
+        return np.bincount(ids, minlength=len(self.names)).astype(float)
+
+    def mining_modifier_of(self, module: str | None) -> float:
+        """
+        Site resources multiplier granted by the module placed in the mining cell.
+        """
+        return float(self.mining_modifier[self.index[module]]) if module in self.index else 0.0
+
+    def evaluate(self, counts: np.ndarray, solar_body: str, site: dict | None = None,
+                 mining_modifier: float | np.ndarray = 0.0) -> np.ndarray:
+        """
+        Compute the final stat columns for one count vector, or a (N, modules) batch of them.
+        """
+        counts = np.asarray(counts, dtype=float)
+        return self.apply_rules(counts @ self.matrix, self.admin_counts(counts), solar_body, site,
+                                mining_modifier)
+
+    def apply_rules(self, totals: np.ndarray, admin_counts: np.ndarray, solar_body: str, site: dict | None = None,
+                    mining_modifier: float | np.ndarray = 0.0) -> np.ndarray:
+        """
+        Apply the non-linear rules to the summed module rows, in place.
+        admin_counts holds the counts of the administration modules only, see admin_counts.
+        """
+        return self.apply_rules_at(totals, admin_counts, c.solar_modifiers[solar_body], solar_body == "Earth (LEO)",
+                                   site, mining_modifier)
+
+    def site_vector(self, site: dict | None) -> np.ndarray:
+        """
+        Site resources of a base, aligned with the support material columns.
+        """
+        return np.array([(site or {}).get(k, 0) for k in self._support_keys], dtype=float)
+
+    def admin_counts(self, counts: np.ndarray) -> np.ndarray:
+        """
+        The administration module counts of module count vectors, the last axis of counts.
+        """
+        return counts[..., self._admin_rows]
+
+    def apply_rules_at(self, totals, admin_counts, solar_modifier, in_leo, site, mining_modifier) -> np.ndarray:
+        """
+        apply_rules with the solar body given as its solar power modifier and LEO flag,
+        scalars or arrays broadcasting over the leading dimensions of totals.
+        The site can also be given as site_vector rows, one per habitat.
+        """
+        col = self.column_index
+        totals[..., col["power"]] += totals[..., col[SOLAR_POWER]] * solar_modifier
+        totals[..., self._leo_cols] = np.where(np.asarray(in_leo)[..., None], totals[..., self._leo_cols], 0)
+
+        admin_bonus = self.admin_bonus[self._admin_rows]
+        admin_modifier = np.asarray(np.where(admin_counts > 0, admin_bonus, 1).max(axis=-1, initial=1))
+        totals[..., self._admin_cols] *= admin_modifier[..., None]
+
+        support = -totals[..., self._support_cols]
+        for j, material in enumerate(self._support_keys):
+            if material in ("volatiles", "water"):
+                discount = totals[..., col[FARM_SUPPLY]] * c.pop_upkeep[material]
+                support[..., j] = np.minimum(0, support[..., j] + discount)
+
+        site_res = site if isinstance(site, np.ndarray) else self.site_vector(site)
+        mining = np.asarray(mining_modifier, dtype=float) * admin_modifier
+        support += site_res * mining[..., None]
+        totals[..., self._support_cols] = support
+
+        return totals
+
+    def sweep(self, counts: np.ndarray, site: dict | None = None, mining_modifier: float = 0.0,
+              bodies=None) -> np.ndarray:
+        """
+        Final stat columns of one habitat at every solar body, one row per body of solar_modifiers.
+        """
+        bodies = list(bodies or c.solar_modifiers)
+        counts = np.asarray(counts, dtype=float)
+        totals = np.tile(counts @ self.matrix, (len(bodies), 1))
+        return self.apply_rules_at(totals, self.admin_counts(counts), np.array([c.solar_modifiers[b] for b in bodies]),
+                                   np.array([b == "Earth (LEO)" for b in bodies]), site, mining_modifier)
+
+    def presence_of(self, counts: np.ndarray) -> np.ndarray:
+        """
+        Columns that at least one of the counted modules sets, deciding which dictionary keys are shown.
+        """
+        return (np.asarray(counts) > 0) @ self.presence
+
+    def to_stats(self, totals: np.ndarray, present: np.ndarray) -> c.HabStats:
+        """
+        Convert the evaluated columns of a single habitat into the HabStats dictionary layout.
+        """
+
+        def value(i):
+            v = float(totals[i])
+            return int(v) if self.integral[i] and v.is_integer() else v
+
+        def group(name):
+            defaults = RESOURCES if name in ("supportMaterials_month", "weightedBuildMaterials") else ()
+            return {k.split(".", 1)[1]: value(i) for i, k in enumerate(self.columns) if k.startswith(f"{name}.")
+                    and (k.split(".", 1)[1] in defaults or present[i] and (name != "leoBonuses" or totals[i]))}
+
+        stats = {}
+        for k in STAT_KEYS:
+            if k == "CanFoundHabs":
+                stats[k] = bool(totals[self.column_index[CAN_FOUND]] > 0)
+            elif k in DICT_STATS:
+                stats[k] = group(k)
+            else:
+                stats[k] = value(self.column_index[k])
+        return stats
+
+    def habitat_stats(self, modules: list[str], solar_body: str, site: dict | None = None,
+                      mining_module: str | None = None) -> c.HabStats:
+        """
+        Compute the full HabStats of a habitat from its placed modules.
+        """
+        counts = self.count_vector(modules)
+        totals = self.evaluate(counts, solar_body, site, self.mining_modifier_of(mining_module))
+        return self.to_stats(totals, self.presence_of(counts))
+
+
+class StatsAccumulator:
+    """
+    Running stats of a single habitat, updated by per-cell deltas instead of full recomputes.
+    Changing a cell updates the module counts, so edits are O(1) whatever the habitat size. The stats are
+    computed from the counts when read, exactly as a full recompute does, so no rounding residue is left behind.
+    """
+
+    def __init__(self, engine: StatsEngine, habitat: dict | None = None):
+        self.engine = engine
+        self.cells: dict[str, str | None] = {}
+        self.counts = np.zeros(len(engine.names))
+        self.present = np.zeros(len(engine.columns), dtype=int)
+        self._synced: tuple[tuple, np.ndarray] | None = None  # Slot labels and array of the last sync
+        if habitat is not None:
+            self.sync(habitat)
+
+    def _add(self, module: str | None, sign: int) -> None:
+        if module:
+            row = self.engine.index[module]
+            self.counts[row] += sign
+            self.present += sign * self.engine.presence[row]
+
+    def set_cell(self, label: str, module: str | None) -> None:
+        """
+        Replace the module of a cell, applying the difference to the running totals.
+        """
+        old = self.cells.get(label)
+        if old == module:
+            return
+        self._add(old, -1)
+        self._add(module, 1)
+        self.cells[label] = module
+
+    def sync(self, habitat: dict) -> None:
+        """
+        Catch up with a habitat dictionary edited elsewhere, e.g. loaded from a file,
+        its cells being a slot array or a "row_col" dictionary. Only the cells whose module differs are updated.
+        """
+        if "slots" in habitat:
+            labels, slots = habitat_table(habitat).labels, habitat["slots"]
+            if self._synced is not None and self._synced[0] is labels and np.array_equal(self._synced[1], slots):
+                return
+            self._synced = (labels, slots.copy())
+            cells = dict(zip(labels, (self.engine.names[m] if m != EMPTY else None for m in slots.tolist())))
+        else:
+            self._synced = None
+            cells = {label: cell[-1] for label, cell in habitat.get("cells", {}).items()}
+        for label in [k for k in self.cells if k not in cells]:
+            self.set_cell(label, None)
+            del self.cells[label]
+        for label, module in cells.items():
+            self.set_cell(label, module)
+
+    def count(self, module: str) -> int:
+        return int(self.counts[self.engine.index[module]])
+
+    def evaluate(self, solar_body: str, site: dict | None = None) -> np.ndarray:
+        """
+        Final stat columns of the habitat, as StatsEngine.evaluate would compute them from scratch.
+        """
+        mining_modifier = self.engine.mining_modifier_of(self.cells.get("0_3"))
+        return self.engine.evaluate(self.counts, solar_body, site, mining_modifier)
+
+    def habitat_stats(self, solar_body: str, site: dict | None = None) -> c.HabStats:
+        return self.engine.to_stats(self.evaluate(solar_body, site), self.present > 0)
+
+    def sweep(self, site: dict | None = None, bodies=None) -> np.ndarray:
+        """
+        Final stat columns of the habitat at every solar body, see StatsEngine.sweep.
+        """
+        return self.engine.sweep(self.counts, site, self.engine.mining_modifier_of(self.cells.get("0_3")), bodies)
+
+    def marginal_gains(self, label: str, candidates: list[str], solar_body: str,
+                       site: dict | None = None) -> np.ndarray:
+        """
+        Change of the final stat columns when the module of a cell is replaced by each candidate,
+        one row per candidate. The current habitat and every candidate are evaluated as one batch,
+        so the admin multiplier, farm discounts and the mining modifier of the mining cell apply.
+        """
+        engine = self.engine
+        rows = np.array([engine.index[m] for m in candidates], dtype=int)
+        counts = np.tile(self.counts, (len(rows) + 1, 1))
+        if self.cells.get(label):
+            counts[1:, engine.index[self.cells[label]]] -= 1
+        counts[np.arange(1, len(rows) + 1), rows] += 1
+
+        mining_modifier = engine.mining_modifier_of(self.cells.get("0_3"))
+        if label == "0_3":
+            mining_modifier = np.concatenate([[mining_modifier], engine.mining_modifier[rows]])
+
+        totals = engine.evaluate(counts, solar_body, site, mining_modifier)
+        return totals[1:] - totals[0]
+
+
+_engines: dict[int, tuple[dict, StatsEngine]] = {}
+
+
+def get_engine(all_modules: dict[str, c.ModuleData]) -> StatsEngine:
+    """
+    Retrieve the compiled stats engine for a module data dictionary, building it on first use.
+    """
+    cached = _engines.get(id(all_modules))
+    if cached is None or cached[0] is not all_modules:
+        cached = _engines[id(all_modules)] = (all_modules, StatsEngine(all_modules))
+    return cached[1]
+
+
+def freeze(value):
+    """
+    Recursively wrap dictionaries into read-only mappings.
+    """
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    return value
+
+
+def habitat_cells(habitat: dict, names: list[str]) -> dict[str, list]:
+    """
+    The "row_col" cells dictionary of a habitat, converted from its slot array for planner habitats.
+    """
+    if "slots" in habitat:
+        return slots_to_cells(habitat_table(habitat), habitat["slots"], names)
+    return habitat.get("cells", {})
+
+
+def habitat_key(habitat: dict, names: list[str]) -> tuple:
+    """
+    Canonical content key of everything the habitat stats depend on, names being the module names of the slot ids.
+    Module placement order doesn't matter, only the module counts.
+    """
+    cells = habitat_cells(habitat, names)
+    return (tuple(sorted(m[-1] for m in cells.values() if m[-1])),
+            habitat.get("body", "Earth (LEO)"),
+            tuple(sorted(habitat.get("site", {}).items())),
+            cells.get("0_3", [None])[-1])
+
+
+@lru_cache(maxsize=256)
+def _cached_habitat_stats(engine: StatsEngine, key: tuple) -> MappingProxyType:
+    modules, solar_body, site, mining_module = key
+    return freeze(engine.habitat_stats(list(modules), solar_body, dict(site), mining_module))
+
+
+def compute_habitat_stats(habitat: dict, all_modules: dict[str, c.ModuleData]) -> MappingProxyType:
+    """
+    Compute the read-only HabStats of a habitat dictionary, as saved by the planner.
+    Pure function of its arguments; unchanged habitats are served from an LRU cache.
+    """
+    engine = get_engine(all_modules)
+    return _cached_habitat_stats(engine, habitat_key(habitat, engine.names))
+
+
+compute_habitat_stats.cache_info = _cached_habitat_stats.cache_info
+compute_habitat_stats.cache_clear = _cached_habitat_stats.cache_clear
@@ -1,30 +1,56 @@
 import smtplib
-import time
 import json
 import streamlit as st
 
+from modules.habitat_slots import load_habitat, save_habitat
+from modules.module_catalog import ModuleCatalog
+from modules.module_template import TEMPLATE_PATH, load_template
+
+
+def load_module_data(path: str = TEMPLATE_PATH) -> ModuleCatalog:
+    """
+    Import the module data, without the undesired modules and the unused fields.
+    Returns the module catalog, a dictionary of module data with prebuilt filter indexes.
+    """
+    return ModuleCatalog(load_template(path))
+
+
+@st.cache_resource
+def get_raw_module_data() -> ModuleCatalog:
+    """
+    Module catalog shared by every session of the app.
+    """
+    return load_module_data()
+
 
 def download_json_file(st_state):
-    return json.dumps(st_state.habitat, separators=(',', ':'))
+    return json.dumps(save_habitat(st_state.habitat, get_raw_module_data()), separators=(',', ':'))
+
+
+def habitat_download_button():
+    """
+    Download button saving the habitat of the session as a JSON file, built from the habitat as it is when drawn.
+    """
+    st.download_button(label="**Save Habitat as JSON**", use_container_width=True,
+                       file_name="habitat_data.json", mime="application/json",
+                       data=download_json_file(st.session_state))
 
 
 def upload_json_file(file, error=False):
     if error:
-        message = st.empty()
-        message.error("No file selected.")
-        time.sleep(2)
-        message.empty()
+        st.toast("No file selected.", icon="⚠️")
         return
 
     try:
         file_contents = file.getvalue().decode("utf-8")
         loaded_data = json.loads(file_contents)
-        st.session_state.habitat = loaded_data
-
-        message = st.empty()
-        message.success("Success! Redirecting...")
-        time.sleep(1)
-        message.empty()
+        st.session_state.habitat = load_habitat(loaded_data, get_raw_module_data())
+        st.session_state.portfolio_entry = None  # A loaded habitat is not linked to the portfolio
+        # The selected cell and picked module belong to the previous layout
+        st.session_state.clicked_cell = None
+        st.session_state.module_choice = None
+        st.session_state.pop("hab_name", None)  # The name input then shows the habitat name
+        st.toast("Habitat loaded.", icon="✅")
 
     except json.JSONDecodeError:
         st.error("Error: Invalid JSON file. Please upload a valid JSON file.")
@@ -1,191 +1,297 @@
-import json
+import numpy as np
 import streamlit as st
 
-from modules.clickable_image import clickable_image
-from modules.constants import ModuleData, habitat_layouts, solar_modifiers, ui_layouts, pretty_stats
-from modules.habitat_stats import display_habitat_stats, get_base64_image
-from modules.habitat_module import module_image, module_tooltip
+from functools import wraps
+
+from modules.build_simulator import display_build_simulation
+from modules.constants import ModuleData, solar_modifiers, ui_layouts, pretty_stats
+from modules.habitat_stats import GAIN_STATS, display_body_sweep, display_habitat_stats, format_gains, \
+    get_base64_image, module_gains, rank_modules
+from modules.habitat_grid import habitat_grid
+from modules.habitat_module import filter_modules, module_tooltip
+from modules.habitat_slots import CORE_CELL, EMPTY, MINING_CELL, decode_habitat, encode_habitat, habitat_table, \
+    slot_table
+from modules.module_catalog import ModuleCatalog
+from modules import profiling
+from modules.stats_engine import StatsAccumulator, get_engine
+from modules.utilities import get_raw_module_data, habitat_download_button
 
 state = st.session_state
 st.set_page_config(page_title="Terra Invicta Planner", page_icon="🛰️", layout="wide", initial_sidebar_state="collapsed")
+profiling.begin_rerun(profiling.requested(), page="habitat_planner")
 
+# True while the whole page runs; fragment reruns only see the value left by the end of the last app run
+state.app_rerun = True
 
-@st.cache_resource
-def get_raw_module_data() -> dict[str, ModuleData]:
+
+def profiled_fragment(func):
     """
-    Import raw module data and filter out undesired modules.
-    Returns a dictionary of module data.
+    Profile the fragment reruns of func on their own, the whole page profile covers it otherwise.
+    The profile is displayed at the end of the fragment, widgets can't be drawn outside of it.
     """
-    excluded_module_types: list[str] = ["alienModule", "destroyed", "automated"]
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if state.app_rerun:
+            return func(*args, **kwargs)
+        profiling.begin_rerun(profiling.requested(), page=f"habitat_planner.{func.__name__}")
+        try:
+            func(*args, **kwargs)
+        finally:
+            fragment_profile = profiling.end_rerun()
+        if fragment_profile is not None:
+            profiling.display_profile(fragment_profile)
+    return wrapper
+
 
-    with open("data/TIHabModuleTemplate.json", "r") as file:
-        return {d["dataName"]: d for d in json.load(file)
-                if not any(d.get(k, False) for k in excluded_module_types)}
+def generate_habitat_layout(core: ModuleData) -> None:
+    """
+    Display the habitat grid of the core module, as a single clickable image.
+    """
+    # Send the selection frames as cacheable static URLs, when the server allows it
+    serve_static_frames = st.get_option("server.enableStaticServing")
+    habitat_grid(core, state, all_modules, key="habitat_grid", serve_static=serve_static_frames)
 
 
-def filter_modules(core: ModuleData, tier_filters: list[str], mining_cell=False) -> dict[str, ModuleData]:
+def select_clicked_cell() -> None:
     """
-    Filter out modules based on core tier and user choice.
-    Returns a dictionary of filtered modules.
+    Apply the last grid click, selecting or emptying its slot, and place the module picked for the selection.
     """
-    income_filters = [pretty_stats[f] for f in tier_filters if not f.startswith("Tier")]
-    tier_filters = [f for f in tier_filters if f.startswith("Tier")]
-    if not tier_filters or "All Modules" in tier_filters:
-        tiers = range(1, core["tier"] + 1)
-    else:
-        tiers = {int(f.split()[-1]) for f in tier_filters if f.startswith("Tier")}
+    table, slots = habitat_table(state.habitat), state.habitat["slots"]
+    click = state.get("habitat_grid")
+    if click and click["time"] != state.get("grid_click_time") and 0 <= click["slot"] < len(slots):
+        state.grid_click_time = click["time"]
+        if click["button"] == "left":
+            state.clicked_cell = click["slot"]
+        elif table.cell_types[click["slot"]] != CORE_CELL and slots[click["slot"]] != EMPTY:
+            slots[click["slot"]] = EMPTY
+            if state.get("stats_accumulator"):
+                state.stats_accumulator.set_cell(table.labels[click["slot"]], None)
+            # The grid image changes, which ends the selection in the browser too
+            state.clicked_cell = None
+            state.module_choice = None
+
+    if state.clicked_cell is not None and state.module_choice:
+        slots[state.clicked_cell] = all_modules.position[state.module_choice]
+        if state.get("stats_accumulator"):
+            state.stats_accumulator.set_cell(table.labels[state.clicked_cell], state.module_choice)
+        state.module_choice = None
+        state.clicked_cell = None
 
-    mods = {k: v for k, v in all_modules.items()
-            if (v["habType"] in (core["habType"], "Any")
-                and v["tier"] in tiers
-                and not v.get("coreModule", False))
-            }
 
-    if income_filters:
-        mods = {k: v for k, v in mods.items() if any(v[income] > 0 for income in income_filters)}
-    return {k: v for k, v in mods.items() if v.get("mine", False)} if mining_cell else mods
+def display_stats(stats_view) -> None:
+    """
+    Draw the habitat stats, and the body comparison and build simulation when enabled, into their placeholder.
+    """
+    # A habitat opened from the portfolio keeps its portfolio entry up to date
+    if state.get("portfolio_entry") is not None:
+        state.portfolio.update(state.portfolio_entry, state.habitat)
 
+    # Keep the "habitat" link parameter opening the current design
+    state.habitat_code = encode_habitat(state.habitat, all_modules)
+    if st.query_params.get("habitat") != state.habitat_code:
+        st.query_params["habitat"] = state.habitat_code
 
-def generate_habitat_layout(core: ModuleData) -> None:
+    with stats_view.container():
+        display_habitat_stats(state.habitat, all_modules, state.stats_accumulator)
+        if state.get("body_sweep"):
+            display_body_sweep(state.habitat, all_modules, state.stats_accumulator)
+        if state.get("build_simulation"):
+            display_build_simulation(state.habitat, all_modules)
+
+
+def open_habitat_link() -> None:
     """
-    Generate the visual layout of the habitat based on the core module.c
+    Open the habitat of the "habitat" link parameter, when it is not the habitat already in the planner.
     """
-    habitat_layout = habitat_layouts[core["habType"]][core["tier"]]
-
-    for row_idx, row in enumerate(habitat_layout):
-        if row_idx == 0 and core["habType"] == "Base":
-            cell_module = state.habitat["cells"].get("0_3", [3, None])[-1]
-            is_mining_module = isinstance(cell_module, str) and "Mining" in cell_module
-
-            cols = st.columns([1, 0.25, 0.25, 4, 0.25, 0.25, 1]) \
-                if is_mining_module else st.columns(len(row))
-        else:
-            cols = st.columns(len(row))
-
-        for col_idx, col in ((i, c) for i, c in enumerate(cols) if row[i] != 0):
-            with col:
-                label = f"{row_idx}_{col_idx}"
-                if label not in state.habitat["cells"]:
-                    state.habitat["cells"][label] = [row[col_idx], None]
-                clickable_image(key=label, use_column_width="always",
-                                source=module_image(core, label, state, all_modules),
-                                tooltip=module_tooltip(label, state, all_modules))
-
-
-row_prefix = ("0_", "1_", "2_", "3_", "4_", "5_", "6_")
-click_timestamps = {k: v for k, v in state.items() if k.startswith(row_prefix) and v}
-state.clicked_cell = max(click_timestamps, key=click_timestamps.get) if click_timestamps else None
-
-if state.clicked_cell and state.module_choice:
-    state.habitat["cells"][state.clicked_cell][-1] = state.module_choice
-    state.module_choice = None
+    code = st.query_params.get("habitat")
+    if not code or code == state.get("habitat_code"):
+        return
+    state.habitat_code = code
+    try:
+        state.habitat = decode_habitat(code, get_raw_module_data())
+    except ValueError as e:
+        st.error(str(e))
+        return
+    state.pop("hab_name", None)  # The name input then shows the habitat name
+    state.portfolio_entry = None
     state.clicked_cell = None
+    state.module_choice = None
+    state.first_run = False
 
 
-col_stats, col_habitat, empty = st.columns(ui_layouts["hab_main"])
-with col_habitat:
+@st.fragment
+@profiled_fragment
+def habitat_editor(core: ModuleData, stats_view) -> None:
+    """
+    Module filters, module picker and habitat grid. Clicking a cell or picking a module
+    reruns only this fragment; the stats depend on the placed modules only,
+    so they are redrawn when those changed.
+    """
+    slots_before = state.habitat["slots"].copy()
+    select_clicked_cell()
+
     sub_layout = ui_layouts["hab_sub"]
-    col_core_choice, col_habitat_type, col_solar_body \
-        = st.columns(sub_layout)
     col_module_filters, col_module_select \
         = st.columns([sub_layout[0], sub_layout[1] + sub_layout[2]])
 
-    habitat_type: str = col_habitat_type.radio(
-        label="Habitat Type",
-        options=("station", "base"),
-        format_func=str.title,
-        index=("station", "base").index(state.get("habitat", {}).get("type", "station")))
-
-    solar_body: str = col_solar_body.selectbox(
-        label="System Body",
-        options=list(solar_modifiers.keys()),
-        index=list(solar_modifiers.keys()).index(
-            state.get("habitat", {}).get("body", list(solar_modifiers.keys())[0])))
-
-    all_modules: dict[str, ModuleData] = get_raw_module_data()
-    cores: dict[str, ModuleData] = {k: v for k, v in all_modules.items()
-                                    if v["coreModule"] and v["habType"] == habitat_type.title()}
-
-    core_choice = col_core_choice.selectbox(
-        label="Select a habitat core:",
-        options=list(cores.keys()),
-        format_func=lambda x: f"Tier {cores[x]['tier']} - {cores[x]['friendlyName']}",
-        index=list(cores.keys()).index(state.get("habitat", {}).get("core"))
-        if state.get("habitat", {}).get("core") in cores else None,
-        placeholder="Select a habitat core...")
-
-    if not core_choice:
-        st.stop()
-
-    active_core = cores[core_choice]
-
-    # Loading a JSON file before opening the Habitat Planner causes an error, when selecting a module
-    # Error: "module_choice" is not initialized in st_session_state
-    # Placeholder fix for now
-    if "module_choice" not in state:
-        state.module_choice = None
-
-    # 🤷 shrug off habitat tier and type changes...
-    if "first_run" not in state \
-            or active_core["tier"] != state.habitat["tier"] \
-            or habitat_type.lower() != state.habitat["type"]:
-        state.habitat = {"cells": {}}
-        state.clicked_cell = None
-        state.module_choice = None
-        state.first_run = False
-    state.habitat["core"] = active_core["dataName"]
-    state.habitat["tier"] = active_core["tier"]
-    state.habitat["type"] = habitat_type.lower()
-    state.habitat["body"] = solar_body
-
-    generate_habitat_layout(active_core)
+    generate_habitat_layout(core)
 
     with col_module_filters:
-        available_tiers: list[str] = [f"Tier {i}" for i in range(1, active_core["tier"] + 1)]
+        available_tiers: list[str] = [f"Tier {i}" for i in range(1, core["tier"] + 1)]
         stat_incomes: list[str] = list(pretty_stats.keys())
         active_filters: list[str] = st.multiselect(
             label="user_filters",
             label_visibility="collapsed",
             placeholder="Filter modules...",
             options=(["All Modules"] + available_tiers + stat_incomes))
+        rank_by: str | None = st.selectbox(
+            label="rank_by",
+            label_visibility="collapsed",
+            placeholder="Rank modules by...",
+            options=list(GAIN_STATS),
+            index=None)
+        habitat_download_button()
 
     with col_module_select:
-        if state.clicked_cell and state.habitat["cells"][state.clicked_cell][0] != 2:
-            is_mining_cell = state.habitat["cells"][state.clicked_cell][0] == 3
-            available_modules = filter_modules(active_core, active_filters, is_mining_cell)
-
-            cell_key = state.clicked_cell
+        table = habitat_table(state.habitat)
+        if state.clicked_cell is not None and table.cell_types[state.clicked_cell] != CORE_CELL:
+            is_mining_cell = table.cell_types[state.clicked_cell] == MINING_CELL
+            available_modules = filter_modules(core, active_filters, all_modules, is_mining_cell)
+
+            # Effect of each module on the habitat stats, shown beside its name
+            cell_key = table.labels[state.clicked_cell]
+            gains = module_gains(state.habitat, state.stats_accumulator, cell_key, list(available_modules))
             st.selectbox(
                 label=f"Select a new module for cell {cell_key}:",
                 label_visibility="collapsed",
-                options=available_modules,
-                format_func=lambda x: available_modules[x]["friendlyName"],
-                placeholder=f"Editing: {module_tooltip(cell_key, state, all_modules)}",
+                options=rank_modules(gains, rank_by) if rank_by else available_modules,
+                format_func=lambda x: f"{all_modules.friendly_names[x]} · {format_gains(gains[x]) or 'no change'}",
+                placeholder=f"Editing: {module_tooltip(state.clicked_cell, state, all_modules)}",
                 key="module_choice")
 
+    if not state.app_rerun and not np.array_equal(state.habitat["slots"], slots_before):
+        display_stats(stats_view)
 
-with col_stats:
-    st.text_input(label="Habitat name:", label_visibility="visible", placeholder="Habitat name...", max_chars=40,
-                  key="hab_name",
-                  value=state.get("habitat", {}).get("name", ""),
-                  on_change=lambda: state.setdefault("habitat", {}).update({"name": state.hab_name}))
 
-    if state.habitat["type"] == "base":
-        @st.dialog("Base Site Resources")
-        def base_site_resources():
-            num_input_kwargs = {"label_visibility": "collapsed", "min_value": 0.00, "step": 1.00}
-            for res in ["water", "volatiles", "metals", "nobleMetals", "fissiles"]:
-                site_res_cols = st.columns([0.5, 5])
-                site_res_cols[0].write(get_base64_image(res), unsafe_allow_html=True)
-                site_res_cols[1].number_input(label=res, key=f"site_{res}", **num_input_kwargs,
-                                              value=state.get("habitat", {}).get("site", {}).get(res, 0.00))
-
-            if st.button("Submit", use_container_width=True):
+@st.fragment
+@profiled_fragment
+def stats_options(stats_view) -> None:
+    """
+    Stats display options, redrawing only the stats when changed.
+    """
+    st.toggle("Compare system bodies", key="body_sweep")
+    st.toggle("Simulate build order", key="build_simulation")
+    if not state.app_rerun:
+        display_stats(stats_view)
+
+
+try:
+    open_habitat_link()
+    col_stats, col_habitat, empty = st.columns(ui_layouts["hab_main"])
+    with col_habitat:
+        sub_layout = ui_layouts["hab_sub"]
+        col_core_choice, col_habitat_type, col_solar_body \
+            = st.columns(sub_layout)
+
+        habitat_type: str = col_habitat_type.radio(
+            label="Habitat Type",
+            options=("station", "base"),
+            format_func=str.title,
+            index=("station", "base").index(state.get("habitat", {}).get("type", "station")))
+
+        solar_body: str = col_solar_body.selectbox(
+            label="System Body",
+            options=list(solar_modifiers.keys()),
+            index=list(solar_modifiers.keys()).index(
+                state.get("habitat", {}).get("body", list(solar_modifiers.keys())[0])))
+
+        all_modules: ModuleCatalog = get_raw_module_data()
+        cores: dict[str, ModuleData] = {k: all_modules[k] for k in all_modules.select(hab_types=(habitat_type.title(),),
+                                                                                     core=True)}
+
+        core_choice = col_core_choice.selectbox(
+            label="Select a habitat core:",
+            options=list(cores.keys()),
+            format_func=lambda x: f"Tier {all_modules.tiers[x]} - {all_modules.friendly_names[x]}",
+            index=list(cores.keys()).index(state.get("habitat", {}).get("core"))
+            if state.get("habitat", {}).get("core") in cores else None,
+            placeholder="Select a habitat core...")
+
+        if not core_choice:
+            st.stop()
+
+        active_core = cores[core_choice]
+
+        # Loading a JSON file before opening the Habitat Planner causes an error, when selecting a module
+        # Error: "module_choice" is not initialized in st_session_state
+        # Placeholder fix for now
+        if "module_choice" not in state:
+            state.module_choice = None
+        if "clicked_cell" not in state:
+            state.clicked_cell = None
+
+        # 🤷 shrug off habitat tier and type changes...
+        if "first_run" not in state \
+                or active_core["tier"] != state.habitat["tier"] \
+                or habitat_type.lower() != state.habitat["type"]:
+            state.habitat = {}
+            state.stats_accumulator = None
+            state.portfolio_entry = None
+            state.clicked_cell = None
+            state.module_choice = None
+            state.first_run = False
+        state.habitat["core"] = active_core["dataName"]
+        state.habitat["tier"] = active_core["tier"]
+        state.habitat["type"] = habitat_type.lower()
+        state.habitat["body"] = solar_body
+
+        # Module ids of the habitat cells, in the slot order of the layout
+        habitat_slots = slot_table(habitat_type, active_core["tier"])
+        if len(state.habitat.get("slots", ())) != len(habitat_slots.labels):
+            state.habitat["slots"] = habitat_slots.empty()
+        state.habitat["slots"][habitat_slots.core_slot] = all_modules.position[active_core["dataName"]]
+
+        # Running habitat stats, updated with the edited cells only
+        if state.get("stats_accumulator") is None or state.stats_accumulator.engine is not get_engine(all_modules):
+            state.stats_accumulator = StatsAccumulator(get_engine(all_modules))
+
+    with col_stats:
+        st.text_input(label="Habitat name:", label_visibility="visible", placeholder="Habitat name...", max_chars=40,
+                      key="hab_name",
+                      value=state.get("habitat", {}).get("name", ""),
+                      on_change=lambda: state.setdefault("habitat", {}).update({"name": state.hab_name}))
+
+        if state.habitat["type"] == "base":
+            @st.dialog("Base Site Resources")
+            def base_site_resources():
+                num_input_kwargs = {"label_visibility": "collapsed", "min_value": 0.00, "step": 1.00}
                 for res in ["water", "volatiles", "metals", "nobleMetals", "fissiles"]:
-                    state.setdefault("habitat", {}).setdefault("site", {})[res] = state[f"site_{res}"]
-                st.rerun()
-
-        if st.button("Add site resources"):
-            base_site_resources()
-
-    display_habitat_stats(state.habitat, all_modules)
+                    site_res_cols = st.columns([0.5, 5])
+                    site_res_cols[0].write(get_base64_image(res), unsafe_allow_html=True)
+                    site_res_cols[1].number_input(label=res, key=f"site_{res}", **num_input_kwargs,
+                                                  value=state.get("habitat", {}).get("site", {}).get(res, 0.00))
+
+                if st.button("Submit", use_container_width=True):
+                    for res in ["water", "volatiles", "metals", "nobleMetals", "fissiles"]:
+                        state.setdefault("habitat", {}).setdefault("site", {})[res] = state[f"site_{res}"]
+                    st.rerun()
+
+            if st.button("Add site resources"):
+                base_site_resources()
+
+        # Drawn by the whole page, then by the fragments when their changes affect the stats
+        habitat_stats_view = st.empty()
+        stats_options(habitat_stats_view)
+
+    with col_habitat:
+        habitat_editor(active_core, habitat_stats_view)
+
+    display_stats(habitat_stats_view)
+finally:
+    state.app_rerun = False
+    rerun_profile = profiling.end_rerun()
+
+# Debug panel, with "?profile=1" in the URL
+if rerun_profile is not None:
+    with st.sidebar:
+        profiling.display_profile(rerun_profile)
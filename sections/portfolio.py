@@ -0,0 +1,110 @@
+import json
+import streamlit as st
+
+from modules.build_simulator import MONTH_DAYS, simulate_portfolio
+from modules.habitat_stats import format_number, format_resource_string, get_base64_image
+from modules.portfolio import Portfolio
+from modules.utilities import get_raw_module_data
+
+state = st.session_state
+st.set_page_config(page_title="Terra Invicta Planner", page_icon="🗂️", layout="wide", initial_sidebar_state="collapsed")
+
+all_modules = get_raw_module_data()
+if state.get("portfolio") is None or state.portfolio.all_modules is not all_modules:
+    state.portfolio = Portfolio(all_modules)
+    state.portfolio_entry = None
+portfolio: Portfolio = state.portfolio
+
+
+def open_in_planner(index: int) -> None:
+    """
+    Load a portfolio habitat into the habitat planner; its edits are then applied to the portfolio entry.
+    """
+    state.habitat = portfolio.habitat(index)
+    state.portfolio_entry = index
+    state.clicked_cell = None
+    state.module_choice = None
+    state.first_run = False
+    st.switch_page("sections/habitat_planner.py")
+
+
+def remove_entry(index: int) -> None:
+    portfolio.remove(index)
+    if state.get("portfolio_entry") == index:
+        state.portfolio_entry = None
+    elif state.get("portfolio_entry") is not None and state.portfolio_entry > index:
+        state.portfolio_entry -= 1
+
+
+st.write("## Habitat Portfolio")
+
+col_totals, col_files = st.columns([3, 1])
+with col_files:
+    if "slots" in state.get("habitat", {}) and state.get("portfolio_entry") is None:
+        if st.button("Add planner habitat", use_container_width=True):
+            state.portfolio_entry = portfolio.add(state.habitat)
+
+    st.download_button(label="**Save Portfolio as JSON**", use_container_width=True,
+                       file_name="portfolio_data.json", mime="application/json", data=portfolio.to_json())
+
+    with st.form(key="portfolio_upload_form", border=False, clear_on_submit=True):
+        file = st.file_uploader(label="upload_portfolio", label_visibility="collapsed", type="JSON")
+        if st.form_submit_button(label="Load Portfolio JSON", use_container_width=True) and file:
+            try:
+                state.portfolio = portfolio = Portfolio.from_json(file.getvalue().decode("utf-8"), all_modules)
+                state.portfolio_entry = None
+            except json.JSONDecodeError:
+                st.error("Error: Invalid JSON file. Please upload a valid JSON file.")
+            except (KeyError, ValueError, TypeError) as e:
+                st.error(f"An error occurred while processing the file: {str(e)}")
+
+with col_totals:
+    totals = portfolio.stats()
+    st.caption(f"{len(portfolio)} habitats")
+    st.markdown("**Portfolio Totals**")
+
+    money = totals["incomeMoney_month"] + totals["supportMaterials_month"].get("money", 0)
+    cols_totals = st.columns(4)
+    for i, (stat, value) in enumerate((("power", totals["power"]), ("incomeMoney_month", money),
+                                       ("incomeInfluence_month", totals["incomeInfluence_month"]),
+                                       ("incomeOps_month", totals["incomeOps_month"]),
+                                       ("incomeResearch_month", totals["incomeResearch_month"]),
+                                       ("missionControl", totals["missionControl"]),
+                                       ("controlPointCapacity", totals["controlPointCapacity"]))):
+        icon = get_base64_image(f"{stat}_negative" if stat == "power" and value <= 0 else stat)
+        cols_totals[i % 4].write(f"{icon} {format_number(value)}", unsafe_allow_html=True)
+
+    upkeep = {r: -v for r, v in totals["supportMaterials_month"].items()}
+    st.caption(f"Upkeep: {format_resource_string(upkeep)}", unsafe_allow_html=True)
+    if totals["techBonuses"]:
+        st.caption("Tech bonuses: " + ", ".join(f"{k}: {format_number(v * 100)}%"
+                                               for k, v in totals["techBonuses"].items()))
+    if totals["leoBonuses"]:
+        st.caption("LEO bonuses: " + ", ".join(f"{k.title()}: {format_number(v)}"
+                                              for k, v in totals["leoBonuses"].items()))
+
+selection = st.dataframe(portfolio.table(), hide_index=True, use_container_width=True, key="portfolio_table",
+                         on_select="rerun", selection_mode="single-row")
+
+if selection.selection.rows:
+    selected = selection.selection.rows[0]
+    col_open, col_remove, _ = st.columns([1, 1, 3])
+    if col_open.button(f"Open {portfolio.names[selected] or 'habitat'} in planner", use_container_width=True):
+        open_in_planner(selected)
+    if col_remove.button("Remove from portfolio", use_container_width=True):
+        remove_entry(selected)
+        st.rerun()
+
+if len(portfolio) and st.toggle("Project build schedules", key="portfolio_projection"):
+    years = st.slider("Years from founding", min_value=1, max_value=30, value=10, key="projection_years")
+    simulation = simulate_portfolio(portfolio, years * 12)
+    money, water, volatiles = (simulation.cumulative("money"), simulation.balance("water"),
+                               simulation.balance("volatiles"))
+    st.line_chart({"Month": simulation.days // MONTH_DAYS, "Money": money.sum(axis=0), "Water": water.sum(axis=0),
+                   "Volatiles": volatiles.sum(axis=0)}, x="Month", y_label="Portfolio balance")
+    st.dataframe({"Name": list(portfolio.names),
+                  "Built by month": [format_number(d / MONTH_DAYS) for d in simulation.completion_days().tolist()],
+                  "Money": [format_number(v) for v in money[:, -1].tolist()],
+                  "Water": [format_number(v) for v in water[:, -1].tolist()],
+                  "Volatiles": [format_number(v) for v in volatiles[:, -1].tolist()]},
+                 hide_index=True, use_container_width=True)
@@ -0,0 +1,24 @@
+import os
+import sys
+import pytest
+
+from pathlib import Path
+
+# The app runs from the repository root, and loads its data files from paths relative to it
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(scope="session", autouse=True)
+def repository_root():
+    cwd = os.getcwd()
+    os.chdir(ROOT)
+    yield ROOT
+    os.chdir(cwd)
+
+
+@pytest.fixture(scope="session")
+def all_modules(repository_root):
+    from modules.utilities import load_module_data
+
+    return load_module_data()
@@ -0,0 +1,33 @@
+import json
+
+from modules.batch_stats import evaluate_habitats
+from modules.habitat_slots import CORE_CELL, slot_table
+from modules.module_template import TEMPLATE_PATH
+from modules.stats_engine import compute_habitat_stats
+
+
+def station_habitat(modules: dict[str, str]) -> dict:
+    table = slot_table("Station", 3)
+    cells = {label: [cell, "RingCore" if cell == CORE_CELL else modules.get(label)]
+             for label, cell in zip(table.labels, table.cell_types.tolist())}
+    return {"name": "Test", "type": "station", "tier": 3, "core": "RingCore", "body": "Earth (LEO)", "cells": cells}
+
+
+def test_batch_rows_match_planner_stats(all_modules):
+    habitat = station_habitat({"0_2": "Atomsmasher", "0_4": "ParticleCollider"})
+    row, = evaluate_habitats([("test", json.dumps(habitat))], TEMPLATE_PATH)
+    stats = compute_habitat_stats(habitat, all_modules)
+
+    assert "error" not in row
+    assert row["power"] == stats["power"]
+    assert row["crew"] == stats["crew"]
+    assert row["CanFoundHabs"] == stats["CanFoundHabs"]
+
+
+def test_batch_drops_unknown_modules_like_the_planner(all_modules):
+    known = station_habitat({"0_2": "Atomsmasher"})
+    unknown = station_habitat({"0_2": "Atomsmasher", "0_4": "NoSuchModule"})
+    rows = evaluate_habitats([("known", json.dumps(known)), ("unknown", json.dumps(unknown))], TEMPLATE_PATH)
+
+    assert "error" not in rows[1]
+    assert {**rows[0], "source": None} == {**rows[1], "source": None}
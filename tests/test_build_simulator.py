@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+from modules import constants as c
+from modules.build_simulator import simulate_habitat, simulate_portfolio
+from modules.habitat_slots import CORE_CELL, MINING_CELL, MODULE_CELL, slot_table
+from modules.portfolio import Portfolio
+from modules.stats_engine import RESOURCES, StatsAccumulator, get_engine
+
+SITE = {r: 1.5 for r in RESOURCES}
+
+
+def mining_base(all_modules, tier: int, mining_cell: bool) -> dict:
+    """
+    A base of the tier with a mining module in a regular cell, and one in the mining cell when asked.
+    """
+    table = slot_table("Base", tier)
+    core = all_modules.select(hab_types=("Base",), tiers=(tier,), core=True)[0]
+    mining = all_modules.select(hab_types=("Base", "Any"), tiers=range(1, tier + 1), core=False, mining=True)
+    slots = table.empty(all_modules.position[core])
+    slots[list(table.cell_types).index(MODULE_CELL)] = all_modules.position[mining[-1]]
+    if mining_cell:
+        slots[table.mining_slot] = all_modules.position[mining[0]]
+    return {"type": "base", "tier": tier, "core": core, "body": "Mars", "site": SITE, "slots": slots}
+
+
+@pytest.mark.parametrize("tier", sorted(c.habitat_layouts["Base"]))
+@pytest.mark.parametrize("mining_cell", (False, True))
+def test_completed_build_matches_habitat_stats(all_modules, tier, mining_cell):
+    habitat = mining_base(all_modules, tier, mining_cell)
+    expected = StatsAccumulator(get_engine(all_modules), habitat).evaluate(habitat["body"], SITE)
+
+    simulation = simulate_habitat(habitat, all_modules, count=4, months=240)
+    assert (simulation.completed[:, -1] == simulation.orders.shape[1]).all()
+    for key, i in simulation.columns.items():
+        np.testing.assert_allclose(simulation.monthly(key)[:, -1], expected[i], atol=1e-9, err_msg=key)
+
+    portfolio = Portfolio.from_habitats([habitat], all_modules)
+    np.testing.assert_allclose(simulate_portfolio(portfolio, months=240).step_stats[0, -1], expected, atol=1e-9)
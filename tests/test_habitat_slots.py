@@ -0,0 +1,93 @@
+import random
+import numpy as np
+import pytest
+
+from modules import constants as c
+from modules.habitat_slots import BODIES, CORE_CELL, EMPTY, MINING_CELL, MODULE_CELL, cell_choices, \
+    decode_habitat, encode_habitat, slot_table
+
+LAYOUTS = [(hab_type, tier) for hab_type, layouts in c.habitat_layouts.items() for tier in layouts]
+
+
+def core_of(all_modules, hab_type: str, tier: int) -> str:
+    return all_modules.select(hab_types=(hab_type,), tiers=(tier,), core=True)[0]
+
+
+def habitat_of(all_modules, hab_type: str, tier: int, slots: np.ndarray, **fields) -> dict:
+    return {"type": hab_type.lower(), "tier": tier, "core": core_of(all_modules, hab_type, tier),
+            "slots": slots, **fields}
+
+
+@pytest.mark.parametrize("hab_type, tier", LAYOUTS)
+def test_code_round_trip(all_modules, hab_type, tier):
+    rng = random.Random(f"{hab_type}{tier}")
+    table = slot_table(hab_type, tier)
+    choices = cell_choices(table, all_modules)
+    for _ in range(50):
+        slots = table.empty(all_modules.position[core_of(all_modules, hab_type, tier)])
+        for slot, cell in enumerate(table.cell_types.tolist()):
+            if cell != CORE_CELL and rng.random() < 0.7:
+                slots[slot] = rng.choice(np.flatnonzero(choices[cell, :EMPTY]).tolist())
+        site = {r: rng.randrange(0, 65536) / 100 for r in ("water", "volatiles", "metals", "nobleMetals", "fissiles")}
+        habitat = habitat_of(all_modules, hab_type, tier, slots, body=rng.choice(BODIES), name="Ceres Ω")
+        if hab_type == "Base":
+            habitat["site"] = site
+
+        decoded = decode_habitat(encode_habitat(habitat, all_modules), all_modules)
+        np.testing.assert_array_equal(decoded["slots"], slots)
+        assert {k: v for k, v in decoded.items() if k != "slots"} \
+            == {k: v for k, v in habitat.items() if k != "slots"}
+
+
+def test_site_resources_are_clamped(all_modules):
+    table = slot_table("Base", 1)
+    habitat = habitat_of(all_modules, "Base", 1, table.empty(all_modules.position[core_of(all_modules, "Base", 1)]),
+                         site={"water": -2, "metals": 1000})
+    decoded = decode_habitat(encode_habitat(habitat, all_modules), all_modules)
+    assert decoded["site"]["water"] == 0 and decoded["site"]["metals"] == 655.35
+
+
+def wrong_cells(all_modules):
+    """
+    Slot edits of a tier 3 station and a tier 1 base that the planner wouldn't make.
+    """
+    station, base = slot_table("Station", 3), slot_table("Base", 1)
+    regular = list(station.cell_types).index(MODULE_CELL)
+    base_module = all_modules.select(hab_types=("Base",), core=False)[0]
+    tier_3 = all_modules.select(hab_types=("Station", "Any"), tiers=(3,), core=False)[0]
+    not_mining = all_modules.select(hab_types=("Base", "Any"), tiers=(1,), core=False, mining=False)[0]
+    return {
+        "lower tier core": ("Station", 3, station.core_slot, core_of(all_modules, "Station", 1)),
+        "base core in a station": ("Station", 3, station.core_slot, core_of(all_modules, "Base", 3)),
+        "module in the core cell": ("Station", 3, station.core_slot, tier_3),
+        "core in a module cell": ("Station", 3, regular, core_of(all_modules, "Station", 3)),
+        "base module in a station": ("Station", 3, regular, base_module),
+        "higher tier module": ("Station", 1, list(slot_table("Station", 1).cell_types).index(MODULE_CELL), tier_3),
+        "regular module in the mining cell": ("Base", 1, base.mining_slot, not_mining),
+    }
+
+
+@pytest.mark.parametrize("case", ["lower tier core", "base core in a station", "module in the core cell",
+                                  "core in a module cell", "base module in a station", "higher tier module",
+                                  "regular module in the mining cell"])
+def test_wrong_cells_are_rejected(all_modules, case):
+    hab_type, tier, slot, module = wrong_cells(all_modules)[case]
+    table = slot_table(hab_type, tier)
+    slots = table.empty(all_modules.position[core_of(all_modules, hab_type, tier)])
+    slots[slot] = all_modules.position[module]
+    code = encode_habitat(habitat_of(all_modules, hab_type, tier, slots), all_modules)
+    with pytest.raises(ValueError, match=f"{module} can't be placed in cell {table.labels[slot]}"):
+        decode_habitat(code, all_modules)
+
+
+def test_missing_core_is_rejected(all_modules):
+    table = slot_table("Station", 2)
+    code = encode_habitat(habitat_of(all_modules, "Station", 2, table.empty()), all_modules)
+    with pytest.raises(ValueError, match="no core module"):
+        decode_habitat(code, all_modules)
+
+
+def test_mining_cells_only_offer_mining_modules(all_modules):
+    choices = cell_choices(slot_table("Base", 3), all_modules)
+    assert choices[MINING_CELL, :EMPTY].any()
+    assert not (choices[MINING_CELL, :EMPTY] & ~all_modules.mining).any()
@@ -0,0 +1,40 @@
+import itertools
+import pytest
+
+from modules.habitat_stats import (CONSTRUCTION_BONUSES, MAX_CONSTRUCTION_MODULES, construction_bonus,
+                                   construction_bonuses)
+
+
+def reference_construction_bonus(t3_count: int, t2_count: int, t1_count: int) -> float:
+    """
+    Construction bonus summed one module at a time, as computed before the lookup table.
+    """
+    total_bonus = 0.0
+    applied_bonuses = 0
+    highest_tier_coeffs = None
+    for count, (base_bonus, coeffs) in zip((t3_count, t2_count, t1_count), CONSTRUCTION_BONUSES):
+        if count > 0 and highest_tier_coeffs is None:
+            highest_tier_coeffs = coeffs
+        for _ in range(count):
+            coeff_index = min(applied_bonuses, len(highest_tier_coeffs) - 1)
+            total_bonus += base_bonus * highest_tier_coeffs[coeff_index]
+            applied_bonuses += 1
+    return min(total_bonus, 0.50)
+
+
+def test_construction_bonus_table_is_bit_identical():
+    counts = range(MAX_CONSTRUCTION_MODULES + 1)
+    for t3, t2, t1 in itertools.product(counts, counts, counts):
+        assert construction_bonus(t3, t2, t1) == reference_construction_bonus(t3, t2, t1), (t3, t2, t1)
+
+
+def test_construction_bonuses_vectorized():
+    t3, t2, t1 = [0, 1, 2, 5], [3, 0, 1, 5], [1, 4, 0, 5]
+    assert construction_bonuses(t3, t2, t1).tolist() == [reference_construction_bonus(*n) for n in zip(t3, t2, t1)]
+
+
+@pytest.mark.parametrize("counts", [(MAX_CONSTRUCTION_MODULES + 1, 0, 0), (0, 0, MAX_CONSTRUCTION_MODULES + 1),
+                                    (0, -1, 0)])
+def test_construction_bonus_rejects_out_of_range_counts(counts):
+    with pytest.raises(ValueError):
+        construction_bonus(*counts)
@@ -0,0 +1,26 @@
+import numpy as np
+
+from modules.module_catalog import ModuleCatalog
+from modules.module_template import USED_FIELDS, load_template, read_template
+from modules.stats_engine import StatsEngine
+
+
+def test_stripped_template_keeps_the_used_fields():
+    full, stripped = read_template(), load_template()
+    assert list(stripped) == list(full)
+    for name, module in full.items():
+        assert stripped[name] == {k: v for k, v in module.items() if k in USED_FIELDS}
+
+
+def test_stripped_template_builds_the_same_catalog_and_engine():
+    full, stripped = ModuleCatalog(read_template()), ModuleCatalog(load_template())
+    assert full.names == stripped.names
+    np.testing.assert_array_equal(full.stats, stripped.stats)
+    for mask in ("core", "mining", "one_per_hab"):
+        np.testing.assert_array_equal(getattr(full, mask), getattr(stripped, mask))
+    assert full.friendly_names == stripped.friendly_names and full.tiers == stripped.tiers
+
+    full_engine, stripped_engine = StatsEngine(full), StatsEngine(stripped)
+    assert full_engine.columns == stripped_engine.columns
+    np.testing.assert_array_equal(full_engine.matrix, stripped_engine.matrix)
+    np.testing.assert_array_equal(full_engine.presence, stripped_engine.presence)
@@ -0,0 +1,76 @@
+import json
+import numpy as np
+import pytest
+
+from modules.benchmark import synthetic_habitats
+from modules.habitat_slots import BODIES, load_habitat
+from modules.portfolio import TABLE_STATS, Portfolio
+from modules.stats_engine import RESOURCES, get_engine, habitat_cells
+
+
+def portfolio_habitats(all_modules) -> list[dict]:
+    """
+    The benchmark habitats, placed on every body in turn.
+    """
+    habitats = [load_habitat(habitat, all_modules) for habitat in synthetic_habitats(all_modules).values()]
+    return [{**habitat, "body": body} for body in BODIES for habitat in habitats]
+
+
+def engine_totals(habitat: dict, all_modules) -> np.ndarray:
+    """
+    Stat columns of a single habitat, evaluated on its own by the stats engine.
+    """
+    engine = get_engine(all_modules)
+    cells = habitat_cells(habitat, engine.names)
+    counts = engine.count_vector([m[-1] for m in cells.values() if m[-1]])
+    return engine.evaluate(counts, habitat["body"], habitat.get("site", {}),
+                           engine.mining_modifier_of(cells.get("0_3", [None])[-1]))
+
+
+def test_portfolio_totals_match_engine(all_modules):
+    habitats = portfolio_habitats(all_modules)
+    expected = np.array([engine_totals(habitat, all_modules) for habitat in habitats])
+
+    portfolio = Portfolio.from_habitats(habitats, all_modules)
+    np.testing.assert_allclose(portfolio.totals, expected, atol=1e-9)
+    np.testing.assert_allclose(portfolio.total, expected.sum(axis=0), atol=1e-9)
+
+    loaded = Portfolio.from_json(portfolio.to_json(), all_modules)
+    np.testing.assert_allclose(loaded.totals, expected, atol=1e-9)
+
+
+def test_portfolio_updates_match_engine(all_modules):
+    habitats = portfolio_habitats(all_modules)
+    portfolio = Portfolio(all_modules)
+    for habitat in habitats[:6]:
+        portfolio.add(habitat)
+    portfolio.update(2, habitats[-1])
+    portfolio.remove(0)
+
+    kept = [habitats[1], habitats[-1], *habitats[3:6]]
+    expected = np.array([engine_totals(habitat, all_modules) for habitat in kept])
+    np.testing.assert_allclose(portfolio.totals, expected, atol=1e-9)
+    np.testing.assert_allclose(portfolio.total, expected.sum(axis=0), atol=1e-9)
+
+
+def test_upkeep_columns_count_resources_spent(all_modules):
+    portfolio = Portfolio.from_habitats(portfolio_habitats(all_modules), all_modules)
+    table = portfolio.table()
+    engine = get_engine(all_modules)
+    for r in RESOURCES:
+        support = portfolio.totals[:, engine.column_index[f"supportMaterials_month.{r}"]]
+        np.testing.assert_allclose(table[f"{r.title()} Upkeep"], np.round(-support, 2))
+    assert set(TABLE_STATS) <= set(table)
+
+
+@pytest.mark.parametrize("edit", [
+    lambda slots, modules: slots[:-1] + [len(modules)],  # Past the module list
+    lambda slots, modules: slots[:-1] + [-2],  # Below EMPTY
+    lambda slots, modules: slots + [0],  # More cells than the layout
+])
+def test_from_json_rejects_bad_module_ids(all_modules, edit):
+    portfolio = Portfolio.from_habitats(portfolio_habitats(all_modules)[:1], all_modules)
+    data = json.loads(portfolio.to_json())
+    data["habitats"]["slots"][0] = edit(data["habitats"]["slots"][0], data["modules"])
+    with pytest.raises(ValueError):
+        Portfolio.from_json(json.dumps(data), all_modules)
@@ -0,0 +1,118 @@
+import random
+import numpy as np
+import pytest
+
+from modules import constants as c
+from modules.habitat_slots import CORE_CELL, MINING_CELL, cells_to_slots, slot_table
+from modules.habitat_stats import base_habitat_stats, get_default_stats, update_habitat_stats
+from modules.stats_engine import RESOURCES, StatsAccumulator, compute_habitat_stats, get_engine
+
+LAYOUTS = [(hab_type, tier) for hab_type, layouts in c.habitat_layouts.items() for tier in layouts]
+
+
+def reference_stats(cells: dict[str, list], all_modules, solar_body: str, site: dict) -> c.HabStats:
+    """
+    Full recompute of the habitat stats through the original per-module functions.
+    """
+    modules = [cell[-1] for cell in cells.values() if cell[-1]]
+    hab_stats = get_default_stats()
+    for module in modules:
+        base_habitat_stats(all_modules[module], hab_stats, solar_body)
+    return update_habitat_stats(hab_stats, modules, all_modules, {"cells": cells, "site": site})
+
+
+def assert_stats_equal(actual, expected, path="stats"):
+    if isinstance(expected, dict):
+        assert set(actual) == set(expected), path
+        for k in expected:
+            assert_stats_equal(actual[k], expected[k], f"{path}.{k}")
+    elif isinstance(expected, bool):
+        assert actual == expected, path
+    else:
+        assert actual == pytest.approx(expected, rel=1e-9, abs=1e-9), path
+
+
+def random_habitat(rng: random.Random, all_modules, hab_type: str, tier: int):
+    """
+    Candidate modules of each cell of a layout, the core placed, and a random body and site.
+    """
+    table = slot_table(hab_type, tier)
+    core = all_modules.select(hab_types=(hab_type,), tiers=(tier,), core=True)[0]
+    modules = all_modules.select(hab_types=(hab_type, "Any"), tiers=range(1, tier + 1), core=False)
+    mining = all_modules.select(hab_types=(hab_type, "Any"), tiers=range(1, tier + 1), core=False, mining=True)
+    choices = {label: mining if cell == MINING_CELL else modules
+               for label, cell in zip(table.labels, table.cell_types.tolist()) if cell != CORE_CELL}
+    cells = {label: [cell, core if cell == CORE_CELL else None]
+             for label, cell in zip(table.labels, table.cell_types.tolist())}
+    site = {r: rng.choice((0, 0.5, 1, 2.25)) for r in RESOURCES} if hab_type == "Base" else {}
+    return cells, choices, rng.choice(list(c.solar_modifiers)), site
+
+
+@pytest.mark.parametrize("hab_type, tier", LAYOUTS)
+def test_accumulator_matches_full_recompute(all_modules, hab_type, tier):
+    rng = random.Random(f"{hab_type}{tier}")
+    engine = get_engine(all_modules)
+    for _ in range(25):
+        cells, choices, solar_body, site = random_habitat(rng, all_modules, hab_type, tier)
+        accumulator = StatsAccumulator(engine, {"cells": cells})
+        for _ in range(40):
+            label = rng.choice(list(choices))
+            module = rng.choice(choices[label] + [None])
+            cells[label][-1] = module
+            accumulator.set_cell(label, module)
+
+            expected = reference_stats(cells, all_modules, solar_body, site)
+            assert_stats_equal(accumulator.habitat_stats(solar_body, site), expected)
+
+
+@pytest.mark.parametrize("hab_type, tier", LAYOUTS)
+def test_marginal_gains_match_full_recompute(all_modules, hab_type, tier):
+    rng = random.Random(f"gains {hab_type}{tier}")
+    engine = get_engine(all_modules)
+    for _ in range(10):
+        cells, choices, solar_body, site = random_habitat(rng, all_modules, hab_type, tier)
+        for label in choices:
+            cells[label][-1] = rng.choice(choices[label] + [None])
+        accumulator = StatsAccumulator(engine, {"cells": cells})
+
+        label = rng.choice(list(choices))
+        candidates = rng.sample(choices[label], min(8, len(choices[label])))
+        gains = accumulator.marginal_gains(label, candidates, solar_body, site)
+
+        before = accumulator.evaluate(solar_body, site)
+        for candidate, row in zip(candidates, gains):
+            edited = StatsAccumulator(engine, {"cells": cells})
+            edited.set_cell(label, candidate)
+            np.testing.assert_allclose(row, edited.evaluate(solar_body, site) - before, rtol=1e-9, atol=1e-9)
+
+            edited_cells = {k: [cell[0], candidate if k == label else cell[-1]] for k, cell in cells.items()}
+            expected = reference_stats(edited_cells, all_modules, solar_body, site)
+            assert_stats_equal(edited.habitat_stats(solar_body, site), expected)
+
+
+@pytest.mark.parametrize("hab_type, tier", LAYOUTS)
+def test_compute_habitat_stats_reads_slots(all_modules, hab_type, tier):
+    rng = random.Random(f"slots {hab_type}{tier}")
+    cells, choices, solar_body, site = random_habitat(rng, all_modules, hab_type, tier)
+    for label in choices:
+        cells[label][-1] = rng.choice(choices[label] + [None])
+    habitat = {"type": hab_type.lower(), "tier": tier, "body": solar_body, "site": site,
+               "slots": cells_to_slots(slot_table(hab_type, tier), cells, all_modules.position)}
+
+    expected = reference_stats(cells, all_modules, solar_body, site)
+    assert_stats_equal(compute_habitat_stats(habitat, all_modules), expected)
+
+
+def test_cleared_cells_leave_no_residue(all_modules):
+    engine = get_engine(all_modules)
+    cells = {label: [cell, "RingCore" if cell == CORE_CELL else None]
+             for label, cell in zip(slot_table("Station", 3).labels, slot_table("Station", 3).cell_types.tolist())}
+    accumulator = StatsAccumulator(engine, {"cells": cells})
+    empty = accumulator.evaluate("Earth (LEO)")
+    for label, module in (("0_2", "Atomsmasher"), ("0_4", "ParticleCollider")):
+        accumulator.set_cell(label, module)
+    for label in ("0_2", "0_4"):
+        accumulator.set_cell(label, None)
+
+    np.testing.assert_array_equal(accumulator.evaluate("Earth (LEO)"), empty)
+    assert accumulator.habitat_stats("Earth (LEO)") == reference_stats(cells, all_modules, "Earth (LEO)", {})